@@ -19,10 +19,12 @@ def main():
     sizes = [20 * (i + 1) for i in range(10)]
     result = {}
     temple_files = []
+    # with LP_INCREMENTAL, the LP is updated from one size to the next
+    lp = IncrementalPlacementLP(model.compiled) if config.LP_INCREMENTAL else None
 
     for size in sizes:
         model.sfc_list = origin_sfc_list[:size]
-        result[size] = iteration(model)
+        result[size] = iteration(model, lp)
         temple_files.append(
             "./results/{}/{}_{}".format(model.topo.name, size, current_time()))
         save_obj(result[size], temple_files[-1])
@@ -34,7 +36,7 @@ def main():
         os.remove(temple_file)
 
 
-def iteration(model: Model):
+def iteration(model: Model, lp: IncrementalPlacementLP = None):
     print("PLACEMENT MAIN")
     result = {}
 
@@ -47,8 +49,8 @@ def iteration(model: Model):
 
     model.clear()
     config.K = 1024
-    result['optimal'] = linear_programming(model)
-    result['RORP'] = ROR(model)
+    result['optimal'] = linear_programming(model, lp=lp)
+    result['RORP'] = ROR(model, lp)
 
     print_dict_result(result, model)
     return result
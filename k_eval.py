@@ -12,6 +12,8 @@ def main():
     model.sfc_list = model.sfc_list[:200]
 
     results = {}
+    # with LP_INCREMENTAL, the LP is updated from one K to the next
+    lp = IncrementalPlacementLP(model.compiled) if config.LP_INCREMENTAL else None
 
     k_list = [64, 128, 256, 512, 768, 1024, 1280, 1536, 1792, 2048, 4096]
     k_list = [16]
@@ -24,8 +26,8 @@ def main():
         model.clear()
 
         tic()
-        result['optimal'] = linear_programming(model)
-        result['RORP'] = ROR(model)
+        result['optimal'] = linear_programming(model, lp=lp)
+        result['RORP'] = ROR(model, lp)
         result['RORP time'] = toc()
         model.clear()
         result['greedy'] = PARC(model)
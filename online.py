@@ -26,23 +26,25 @@ def main():
         for batch_size in batch_sizes:
             result[alg][batch_size] = {}
             model.clear()
-            cur = Model(copy.deepcopy(model.topo), [])
+            cur = Model(model.topo, [])
+            # with LP_INCREMENTAL, the LP is updated from one batch to the next
+            lp = IncrementalPlacementLP(cur.compiled) if config.LP_INCREMENTAL else None
             for i in range(0, total_size, batch_size):
                 cur.sfc_list = origin_sfc_list[i:i + batch_size]
-                result[alg][batch_size][i] = iteration(cur, alg)
+                result[alg][batch_size][i] = iteration(cur, alg, lp)
                 cur = cur.reduce()
 
     print_dict_result(result, model)
     save_obj(result, "./results/online/{}".format(current_time()))
 
 
-def iteration(model: Model, algorithm):
+def iteration(model: Model, algorithm, lp: IncrementalPlacementLP = None):
     if algorithm == 'PARC':
         return PARC(model)[0]
     elif algorithm == 'ROR':
         config.K = 1024
-        linear_programming(model)
-        return ROR(model)[0]
+        linear_programming(model, lp=lp)
+        return ROR(model, lp)[0]
     return 0
 
 
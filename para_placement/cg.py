@@ -1,82 +1,204 @@
 # configuration generation
 
+from collections import deque
+
 from pulp import *
 
+from para_placement.lp import IncrementalPlacementLP
 from para_placement.model import *
+from para_placement.routing import router
+import bisect
+import heapq
+import math
+import multiprocessing
+import os
 import time
 
 
-def _generate_configurations_for_one_route_dc(topo: nx.Graph, route: List[int], route_latency: int, sfc: SFC,
-                                              route_idx: int) -> List[Configuration]:
-    server_pos_list = [idx for idx, node in enumerate(
-        route) if topo.nodes[node]['computing_resource'] > 0]
+def _route_placements(topo: CompiledTopology, route: List[int], route_latency: float, sfc: SFC):
+    """
+    Yield (rank, place) of the monotone placements of sfc on the servers of route
+    (each server hosts a segment of vnfs, in route order) that fit their cpu and the latency of sfc.
+    rank is the position of the placement among all monotone ones in lexicographic order, feasible or not.
+
+    The search carries the cpu used on each server and the latency of the closed segments,
+    a branch is cut as soon as a server is over its cpu or the latency bound
+    (closed segments + ParaAnalyzer optimum of the rest) is over the latency of sfc.
+    """
+    server_pos_list = [idx for idx, node in enumerate(route) if topo.cpu[node] > 0]
     m = len(sfc.vnf_list)
     n = len(server_pos_list)
+    if n == 0 or n > m:
+        return
+
+    flexchain = config.state == config.Setting.flexchain
+    if flexchain:
+        group_latency = _group_latency(sfc)
+    else:
+        # the latency does not depend on the placement
+        vnf_latency = sfc.latency_sum if config.state == config.Setting.no_para else sfc.pa.opt_latency
+        if route_latency + vnf_latency > sfc.latency:
+            return
+    usage = {}
+    place = []
+    rank = 0
+
+    def search(i: int, p: int, segment_start: int, closed_latency: float):
+        # vnfs before i are placed, the last one on server p, its segment starts at segment_start
+        nonlocal rank
+        if i == m:
+            if p == n - 1:
+                if not flexchain or \
+                        route_latency + (closed_latency + group_latency[segment_start][m]) <= sfc.latency:
+                    yield rank, place[:]
+                rank += 1
+            return
+
+        vnf = sfc.vnf_list[i]
+        for next_p in range(p, min(p + 1, n - 1) + 1):
+            node = route[server_pos_list[next_p]]
+            next_start, next_closed = segment_start, closed_latency
+            feasible = usage.get(node, 0) + vnf.computing_resource <= topo.cpu[node]
+            if feasible and flexchain and next_p != p:
+                next_start, next_closed = i, closed_latency + group_latency[segment_start][i]
+                # tolerance: the bound may round above the latency of a feasible placement
+                feasible = route_latency + next_closed + group_latency[i][m] <= sfc.latency + _LATENCY_TOLERANCE
+            if not feasible:
+                # skip the placements of the subtree
+                rank += math.comb(m - i - 1, n - 1 - next_p)
+                continue
 
-    placement_set = []
-    queue = [[0]]
+            usage[node] = usage.get(node, 0) + vnf.computing_resource
+            place.append(server_pos_list[next_p])
+            yield from search(i + 1, next_p, next_start, next_closed)
+            place.pop()
+            usage[node] -= vnf.computing_resource
 
-    while queue:
-        cur_placement = queue.pop(0)
-        last_server_index = cur_placement[-1]
-        if len(cur_placement) == m:
-            if cur_placement[-1] == n - 1:
-                placement_set.append([server_pos_list[i]
-                                      for i in cur_placement])
-        else:
-            for next_server_pos in range(last_server_index, min(last_server_index + 2, n)):
-                new_placement = cur_placement[:]
-                new_placement.append(next_server_pos)
-                queue.append(new_placement)
+    node = route[server_pos_list[0]]
+    if sfc.vnf_list[0].computing_resource <= topo.cpu[node]:
+        usage[node] = sfc.vnf_list[0].computing_resource
+        place.append(server_pos_list[0])
+        yield from search(1, 0, 0, 0)
 
-    configurations = [Configuration(sfc, route, placement, route_latency, "{}_{}".format(route_idx, idx)) for
-                      idx, placement in enumerate(placement_set)]
 
-    def computing_resource_check(c, topo):
-        return all(
-            c.computing_resource[node] <= topo.nodes[node]['computing_resource'] for node in c.computing_resource)
+_LATENCY_TOLERANCE = 1e-9
 
-    configurations = [
-        c for c in configurations if computing_resource_check(c, topo) and c.get_latency() <= sfc.latency]
 
-    return configurations
+def _generate_configurations_for_one_route_dc(topo: CompiledTopology, route: List[int], route_latency: int, sfc: SFC,
+                                              route_idx: int) -> List[Configuration]:
+    placements = list(_route_placements(topo, route, route_latency, sfc))
+    return route_configurations(topo, sfc, route, [place for rank, place in placements], route_latency,
+                                ["{}_{}".format(route_idx, rank) for rank, place in placements])
 
 
-def _route_capacity(topo: nx.Graph, route: List):
-    return sum(topo.nodes[node]['computing_resource'] for node in route)
+def _route_capacity(topo: CompiledTopology, route: List[int]):
+    return sum(topo.cpu[node] for node in route)
 
 
-def _bfs_route(topo: nx.Graph, s, d, sfc: SFC) -> (List, float):
-    queue = [([s], 0)]
-    passed_node = [s]
-    servers = [node for node in topo.nodes if topo.nodes[node]
-    ['computing_resource'] > 0]
-    if d in servers:
-        servers.remove(d)
+def _bfs_route(topo: CompiledTopology, s: int, d: int, sfc: SFC) -> (List[int], float):
+    return route_cache.get(topo, s, d, sfc.throughput)
+
+
+def _bfs_route_uncached(topo: CompiledTopology, s: int, d: int, tp) -> (List[int], float):
+    if config.ROUTING == 'latency':
+        router.sync(topo)
+        route, latency, _ = router.route(topo.bandwidth, s, d, tp, at_least=True, cpu=topo.cpu)
+        return (route, latency) if route else ([], sys.maxsize)
+    parents = {s: None}
+    latencies = {s: 0}
+    queue = deque([s])
 
     while queue:
-        route, latency = queue.pop(0)
-        cur_node = route[-1]
+        cur_node = queue.popleft()
 
         if cur_node == d:
-            return route, latency
+            route = []
+            while cur_node is not None:
+                route.append(cur_node)
+                cur_node = parents[cur_node]
+            route.reverse()
+            return route, latencies[d]
         else:
-            adjacent_nodes = topo[cur_node]
-            for adj_node in adjacent_nodes:
-                if adj_node in passed_node or adj_node in servers:
+            for adj_node, eid in topo.adj[cur_node]:
+                # servers other than d are not used as relays
+                if adj_node in parents or (topo.cpu[adj_node] > 0 and adj_node != d):
                     continue
-                if topo[cur_node][adj_node]['bandwidth'] < sfc.throughput:
+                if topo.bandwidth[eid] < tp:
                     continue
-                passed_node.append(adj_node)
-                new_route = route[:]
-                new_route.append(adj_node)
-                queue.append(
-                    (new_route, latency + adjacent_nodes[adj_node]['latency']))
+                parents[adj_node] = cur_node
+                latencies[adj_node] = latencies[cur_node] + topo.latency[eid]
+                queue.append(adj_node)
 
     return [], sys.maxsize
 
 
-def _generate_routes_for_permutation(topo: nx.Graph, server_permutation, sfc: SFC) -> (List, float):
+class RouteCache(BaseObject):
+    """
+    Routes of _bfs_route keyed by (s, d, throughput class).
+    Throughputs of one class, between the same two distinct residual bandwidths, see the same usable edges.
+    The routes depend on the residual bandwidths, on which nodes are servers and on config.ROUTING,
+    sync(topo) drops them when one changed, it must be called before get once they may have.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._cache = {}
+        self._structure = None
+        self._bandwidth = None
+        self._relays = None
+        self._routing = None
+        self._levels = []
+
+    def __str__(self):
+        total = self.hits + self.misses
+        return "hits: {}\tmisses: {}\thit rate: {:.2f}%\tsize: {}\tinvalidations: {}".format(
+            self.hits, self.misses, self.hits / total * 100 if total else 0, len(self._cache), self.invalidations)
+
+    def sync(self, topo: CompiledTopology):
+        structure = getattr(topo, 'base', topo)
+        relays = topo.cpu <= 0
+        routing = config.ROUTING, config.ROUTING_WIDEST
+        if self._structure is structure and numpy.array_equal(self._bandwidth, topo.bandwidth) and \
+                numpy.array_equal(self._relays, relays) and self._routing == routing:
+            return
+        if self._cache:
+            self.invalidations += 1
+        self._cache.clear()
+        self._structure = structure
+        self._bandwidth = topo.bandwidth.copy()
+        self._relays = relays
+        self._routing = routing
+        self._levels = numpy.unique(topo.bandwidth).tolist()
+
+    def get(self, topo: CompiledTopology, s: int, d: int, tp) -> (List[int], float):
+        key = (s, d, bisect.bisect_left(self._levels, tp))
+        ret = self._cache.get(key)
+        if ret is not None:
+            self.hits += 1
+            return ret
+
+        self.misses += 1
+        route, latency = _bfs_route_uncached(topo, s, d, tp)
+        # shared by every caller
+        ret = self._cache[key] = tuple(route), latency
+        return ret
+
+    def clear(self):
+        self._cache.clear()
+        self._structure = None
+
+    def reset_counters(self):
+        self.hits = self.misses = self.invalidations = 0
+
+
+route_cache = RouteCache()
+# residual cpu order of the topology being searched, see ServerIndex.sync
+server_index = ServerIndex()
+
+
+def _generate_routes_for_permutation(topo: CompiledTopology, server_permutation, sfc: SFC) -> (List, float):
     route = []
     latency = 0
     for s, d in pairwise(server_permutation):
@@ -89,21 +211,35 @@ def _generate_routes_for_permutation(topo: nx.Graph, server_permutation, sfc: SF
     return route, latency
 
 
-def _generate_configurations_permutation(topo: nx.Graph, sfc: SFC):
+def _candidate_servers(topo: CompiledTopology, sfc: SFC, usage: float, by_cpu: bool = False) -> List[int]:
+    """
+    Nodes with at least usage cpu among the candidate servers of sfc (set by the presolve, if any),
+    by id or by decreasing cpu (by id on ties).
+    """
+    nodes = getattr(sfc, 'servers', None)
+    if nodes is None:
+        server_index.sync(topo)
+        servers = server_index.top(usage)
+        return servers if by_cpu else sorted(servers)
+    servers = [node for node in nodes if topo.cpu[node] >= usage]
+    if by_cpu:
+        servers.sort(key=lambda node: topo.cpu[node], reverse=True)
+    return servers
+
+
+def _generate_configurations_permutation(topo: CompiledTopology, sfc: SFC):
     """
     Generate Configurations:
     1. Permute servers
     2. Generate routes by the server permutation
     3. Generate configurations by the routes
     """
+    route_cache.sync(topo)
     configurations = []
     sfc_min_usage = min(vnf.computing_resource for vnf in sfc.vnf_list)
     sfc_max_usage = max(vnf.computing_resource for vnf in sfc.vnf_list)
-    servers = [node for node in topo.nodes if topo.nodes[node]
-    ['computing_resource'] >= sfc_min_usage]
-    servers.sort(
-        key=lambda node: topo.nodes[node]['computing_resource'], reverse=True)
-    top_ratio = sum(topo.nodes[server]['computing_resource'] for server in servers[:len(
+    servers = _candidate_servers(topo, sfc, sfc_min_usage, by_cpu=True)
+    top_ratio = sum(topo.cpu[server] for server in servers[:len(
         sfc.vnf_list)]) / sfc.computing_resources_sum
     if top_ratio < 1.0:
         return []
@@ -112,7 +248,7 @@ def _generate_configurations_permutation(topo: nx.Graph, sfc: SFC):
         if c:
             configurations.append(c)
         return configurations
-    if topo.nodes[servers[0]]['computing_resource'] < sfc_max_usage:
+    if topo.cpu[servers[0]] < sfc_max_usage:
         return []
     if sfc.pa.opt_latency > sfc.latency:
         return []
@@ -124,12 +260,12 @@ def _generate_configurations_permutation(topo: nx.Graph, sfc: SFC):
 
             server_permutation = list(server_permutation)
 
-            if all(topo.nodes[node]['computing_resource'] < sfc_max_usage for node in server_permutation) or \
+            if all(topo.cpu[node] < sfc_max_usage for node in server_permutation) or \
                     _route_capacity(topo, server_permutation) < sfc.computing_resources_sum:
                 continue
 
             route, route_latency = _generate_routes_for_permutation(
-                topo, [sfc.s, *server_permutation, sfc.d], sfc)
+                topo, [topo.index[sfc.s], *server_permutation, topo.index[sfc.d]], sfc)
             route_configurations = _generate_configurations_for_one_route_dc(
                 topo, route, route_latency, sfc, route_idx)
             configurations.extend(route_configurations)
@@ -150,20 +286,128 @@ def _generate_configurations_permutation(topo: nx.Graph, sfc: SFC):
     return configurations
 
 
+def _best_first_routes(topo: CompiledTopology, sfc: SFC):
+    """
+    Yield (route, place, route_latency) of the configurations of the permutation search (distinct servers,
+    each one hosting a segment of vnfs, routed by _bfs_route) in non-decreasing latency.
+
+    Partial placements (last server, k vnfs placed) are popped by a lower bound of their final latency:
+    the latency so far + the ParaAnalyzer optimum of the remaining vnfs + the shortest path latency to d.
+    A complete placement is pushed with its exact latency, so it is popped only when no partial placement
+    can end with a lower one. Placements over the cpu of a server or the latency of sfc are cut.
+    The search stops after search_limit placements popped or time_limit seconds.
+    """
+    s = topo.index[sfc.s]
+    d = topo.index[sfc.d]
+    m = len(sfc.vnf_list)
+    tp = sfc.throughput
+    group_latency = _group_latency(sfc)
+    cpu_prefix = [0, *itertools.accumulate(vnf.computing_resource for vnf in sfc.vnf_list)]
+    latency_to_d = _distance_to(topo, d, topo.latency.tolist())
+    cpu = topo.cpu.tolist()
+    sfc_min_usage = min(vnf.computing_resource for vnf in sfc.vnf_list)
+    servers = _candidate_servers(topo, sfc, sfc_min_usage)
+
+    # state: (server, vnfs placed before it, vnfs placed up to it, parent state, latency so far)
+    states = [(s, 0, 0, None, 0)]
+    # (latency or its lower bound, -vnfs placed, state, complete)
+    heap = [(group_latency[0][m] + latency_to_d[s], 0, 0, False)]
+
+    start = time.time()
+    search = 0
+    while heap:
+        search += 1
+        if search > search_limit or time.time() - start > time_limit:
+            return
+        bound, k, label, complete = heapq.heappop(heap)
+        chain = []
+        state = label
+        while state is not None:
+            chain.append(states[state])
+            state = states[state][3]
+        chain.reverse()
+
+        if complete:
+            route = []
+            place = []
+            route_latency = 0
+            for prev, cur in pairwise(chain):
+                sub_route, sub_latency = route_cache.get(topo, prev[0], cur[0], tp)
+                route.extend(sub_route[:-1])
+                place.extend([len(route)] * (cur[2] - cur[1]))
+                route_latency += sub_latency
+            sub_route, sub_latency = route_cache.get(topo, chain[-1][0], d, tp)
+            route.extend(sub_route)
+            route_latency += sub_latency
+            yield route, place, route_latency
+            continue
+
+        node, last_k, k, parent, latency = chain[-1]
+        used = set(state[0] for state in chain)
+        for server in servers:
+            if server in used:
+                continue
+            sub_route, sub_latency = route_cache.get(topo, node, server, tp)
+            if not sub_route:
+                continue
+            for j in range(k + 1, m + 1):
+                if cpu_prefix[j] - cpu_prefix[k] > cpu[server]:
+                    break
+                server_latency = latency + sub_latency + group_latency[k][j]
+                if j < m:
+                    bound = server_latency + group_latency[j][m] + latency_to_d[server]
+                else:
+                    d_route, d_latency = route_cache.get(topo, server, d, tp)
+                    if not d_route:
+                        continue
+                    bound = server_latency + d_latency
+                if bound <= sfc.latency:
+                    states.append((server, k, j, label, server_latency))
+                    heapq.heappush(heap, (bound, -j, len(states) - 1, j == m))
+
+
+def _generate_configurations_best_first(topo: CompiledTopology, sfc: SFC) -> List[Configuration]:
+    """The config.K configurations of least latency, or the best ones found before the timeout."""
+    route_cache.sync(topo)
+    if sfc.pa.opt_latency > sfc.latency:
+        return []
+    sfc_max_usage = max(vnf.computing_resource for vnf in sfc.vnf_list)
+    if all(topo.cpu[node] < sfc_max_usage for node in range(topo.n)):
+        return []
+
+    configurations = []
+    start = time.time()
+    for route, place, route_latency in _best_first_routes(topo, sfc):
+        configuration = Configuration(topo, sfc, route, place, route_latency, len(configurations))
+        # the bound and get_latency may differ by float rounding
+        if configuration.get_latency() <= sfc.latency:
+            configurations.append(configuration)
+        if len(configurations) >= config.K or time.time() - start > time_limit:
+            break
+
+    if not configurations:
+        # the greedy search may also relay through servers
+        c = generate_configuration_greedy_dfs(topo, sfc)
+        if c and c.get_latency() <= sfc.latency:
+            configurations.append(c)
+    return configurations
+
+
 time_limit = .5
 route_limit = 15
 search_limit = 256 * 1024
 
 
-def _generate_configurations_bfs(topo: nx.Graph, sfc: SFC) -> List[Configuration]:
-    queue = [([sfc.s], 0)]
+def _generate_configurations_bfs(topo: CompiledTopology, sfc: SFC) -> List[Configuration]:
+    queue = [([topo.index[sfc.s]], 0)]
+    d = topo.index[sfc.d]
     route_idx = 0
     configurations = []
     sfc_max_usage = max(vnf.computing_resource for vnf in sfc.vnf_list)
 
-    if all(topo.nodes[node]['computing_resource'] < sfc_max_usage for node in topo.nodes):
+    if all(topo.cpu[node] < sfc_max_usage for node in range(topo.n)):
         return []
-    pa = ParaAnalyzer(sfc.vnf_list)
+    pa = pa_cache.get(sfc.vnf_list)
     if pa.opt_latency > sfc.latency:
         return []
 
@@ -181,7 +425,7 @@ def _generate_configurations_bfs(topo: nx.Graph, sfc: SFC) -> List[Configuration
                 configurations.append(c)
             break
 
-        if route[-1] == sfc.d:
+        if route[-1] == d:
             # accept the route (get the dest & the capacity is enough)
             route_configurations = _generate_configurations_for_one_route_dc(
                 topo, route, route_latency, sfc, route_idx)
@@ -191,40 +435,40 @@ def _generate_configurations_bfs(topo: nx.Graph, sfc: SFC) -> List[Configuration
                 break
         else:
             # extend the route
-            adjacent_nodes = topo[last_node]
-            for node in adjacent_nodes:
-                latency = adjacent_nodes[node]['latency']
+            for node, eid in topo.adj[last_node]:
+                latency = topo.latency[eid]
                 queue.append(([*route, node], route_latency + latency))
 
     return configurations
 
 
-def _generate_configurations_one_machine_permutation(topo: nx.Graph, sfc: SFC) -> List[Configuration]:
+def _generate_configurations_one_machine_permutation(topo: CompiledTopology, sfc: SFC) -> List[Configuration]:
+    route_cache.sync(topo)
     configurations = []
-    servers = [node for node in topo.nodes if topo.nodes[node]
-    ['computing_resource'] >= sfc.computing_resources_sum]
-    pa = ParaAnalyzer(sfc.vnf_list)
+    servers = _candidate_servers(topo, sfc, sfc.computing_resources_sum)
+    pa = pa_cache.get(sfc.vnf_list)
     if pa.opt_latency > sfc.latency:
         return []
 
     for idx, server in enumerate(servers):
         route, route_latency = _generate_routes_for_permutation(
-            topo, [sfc.s, server, sfc.d], sfc)
+            topo, [topo.index[sfc.s], server, topo.index[sfc.d]], sfc)
         place = [route.index(server) for vnf in sfc.vnf_list]
         route_configuration = Configuration(
-            sfc, route, place, route_latency, idx)
+            topo, sfc, route, place, route_latency, idx)
         configurations.append(route_configuration)
     return configurations
 
 
-def _generate_configurations_one_machine_bfs(topo: nx.Graph, sfc: SFC) -> List[Configuration]:
-    queue = [([sfc.s], 0)]
+def _generate_configurations_one_machine_bfs(topo: CompiledTopology, sfc: SFC) -> List[Configuration]:
+    queue = [([topo.index[sfc.s]], 0)]
+    d = topo.index[sfc.d]
     idx = 0
     configurations = []
     search = 0
     last_search = 1024
 
-    if all(topo.nodes[node]['computing_resource'] < sfc.computing_resources_sum for node in topo.nodes):
+    if all(topo.cpu[node] < sfc.computing_resources_sum for node in range(topo.n)):
         return []
 
     while queue:
@@ -240,21 +484,20 @@ def _generate_configurations_one_machine_bfs(topo: nx.Graph, sfc: SFC) -> List[C
             print("\nFULL({})".format(len(route)))
             break
 
-        if route[-1] == sfc.d:
+        if route[-1] == d:
             # accept the route (get the dest & the capacity is enough)
             for node_idx, node in enumerate(route):
-                if topo.nodes[node]['computing_resource'] >= sfc.computing_resources_sum:
+                if topo.cpu[node] >= sfc.computing_resources_sum:
                     configurations.append(Configuration(
-                        sfc, route, [node_idx] * len(sfc.vnf_list), latency, idx))
+                        topo, sfc, route, [node_idx] * len(sfc.vnf_list), latency, idx))
                     idx += 1
 
             if len(configurations) >= config.K:
                 break
         else:
             # extend the route
-            adjacent_nodes = topo[last_node]
-            for node in adjacent_nodes:
-                adj_latency = adjacent_nodes[node]['latency']
+            for node, eid in topo.adj[last_node]:
+                adj_latency = topo.latency[eid]
 
                 if latency + adj_latency > sfc.latency:
                     continue
@@ -267,16 +510,58 @@ def _generate_configurations_one_machine_bfs(topo: nx.Graph, sfc: SFC) -> List[C
     return configurations
 
 
-def generate_configurations(topo: nx.Graph, sfc: SFC) -> List[Configuration]:
+def generate_configurations(topo: CompiledTopology, sfc: SFC) -> List[Configuration]:
     if config.state == config.Setting.nfp_naive:
         return _generate_configurations_one_machine_permutation(topo, sfc)
     if config.GC_BFS:
         return _generate_configurations_bfs(topo, sfc)
+    if config.GC_BEST_FIRST:
+        return _generate_configurations_best_first(topo, sfc)
     return _generate_configurations_permutation(topo, sfc)
 
 
-def generate_configuration_greedy_dfs(topo: nx.Graph, sfc: SFC, origin_sfc: SFC = None, deep: int = 10,
-                                      debug=False) -> Configuration:
+# config values the generation depends on, copied to the worker processes
+_WORKER_SETTINGS = ('state', 'K', 'GC_BFS', 'GC_BEST_FIRST', 'PA_DP', 'PA_CACHE_SIZE', 'ROUTING', 'ROUTING_LANDMARKS',
+                    'ROUTING_WIDEST')
+_worker_topo: CompiledTopology = None
+_worker_sfc_list: List[SFC] = []
+
+
+def _init_worker(topo: CompiledTopology, sfc_list: List[SFC], settings: dict, limit: float):
+    global _worker_topo, _worker_sfc_list, time_limit
+    _worker_topo = topo
+    _worker_sfc_list = sfc_list
+    for name, setting in settings.items():
+        setattr(config, name, setting)
+    time_limit = limit
+
+
+def _generate_configurations_task(row: int):
+    configurations = generate_configurations(_worker_topo, _worker_sfc_list[row])
+    # the configurations are rebuilt on the topology of the parent, only send what defines them
+    return [(c.route, c.place, c.route_latency, c.idx) for c in configurations]
+
+
+def generate_configurations_parallel(topo: CompiledTopology, sfc_list: List[SFC], workers: int = None):
+    """
+    Yield generate_configurations(topo, sfc) for each sfc of sfc_list in order, generated by a pool of processes.
+    topo and sfc_list are shipped once to each worker, the tasks are the sfc rows.
+    Every sfc is generated as in a sequential run, so the configurations and their names are the same.
+    """
+    workers = workers or os.cpu_count()
+    settings = {name: getattr(config, name) for name in _WORKER_SETTINGS}
+    with multiprocessing.Pool(workers, _init_worker, (topo, sfc_list, settings, time_limit)) as pool:
+        results = pool.imap(_generate_configurations_task, range(len(sfc_list)))
+        for sfc, configurations in zip(sfc_list, results):
+            yield [Configuration(topo, sfc, route, place, route_latency, idx) for route, place, route_latency, idx in
+                   configurations]
+
+
+def generate_configuration_greedy_dfs(topo: CompiledTopology, sfc: SFC, origin_sfc: SFC = None, deep: int = 10,
+                                      debug=False, index: ServerIndex = None) -> Configuration:
+    if index is None:
+        index = server_index
+        index.sync(topo)
     if config.state == config.Setting.parabox_naive and origin_sfc is None:
         origin_sfc = sfc
         tp = origin_sfc.throughput * \
@@ -284,24 +569,16 @@ def generate_configuration_greedy_dfs(topo: nx.Graph, sfc: SFC, origin_sfc: SFC
         sfc = SFC(origin_sfc.vnf_list[:],
                   sfc.latency, tp, sfc.s, sfc.d, sfc.idx)
 
-    s = sfc.s
-    d = sfc.d
+    s = topo.index[sfc.s]
+    d = topo.index[sfc.d]
     if not sfc.vnf_list:
         route, route_latency = _bfs_route_general(topo, s, d, sfc.throughput)
-        return Configuration(sfc, route, [], route_latency, 0)
+        return Configuration(topo, sfc, route, [], route_latency, 0)
 
     sfc_min_requirement = sfc.vnf_list[0].computing_resource
     if config.state == config.Setting.nfp_naive:
         sfc_min_requirement = sfc.computing_resources_sum
-    servers = [node for node in topo.nodes if topo.nodes[node]
-    ['computing_resource'] >= sfc_min_requirement]
-    servers.sort(key=lambda s: topo.nodes[s]
-    ['computing_resource'], reverse=True)
-    # if [topo.nodes[s]['computing_resource'] for s in servers[:len(sfc.vnf_list)]] < sfc.computing_resources_sum:
-    #     return None
-
-    if len(servers) > deep:
-        servers = servers[:deep]
+    servers = index.top(sfc_min_requirement, deep)
 
     for server in servers:
         route, route_latency = _bfs_route_general(
@@ -312,14 +589,15 @@ def generate_configuration_greedy_dfs(topo: nx.Graph, sfc: SFC, origin_sfc: SFC
             sub_vnf_list = sfc.vnf_list[:]
             placed_res = 0
             place = []
-            while sub_vnf_list and sub_vnf_list[0].computing_resource <= topo.nodes[server][
-                'computing_resource']:
+            while sub_vnf_list and sub_vnf_list[0].computing_resource <= topo.cpu[server]:
                 placed_res += sub_vnf_list[0].computing_resource
-                topo.nodes[server]['computing_resource'] -= sub_vnf_list[0].computing_resource
+                topo.cpu[server] -= sub_vnf_list[0].computing_resource
+                index.set(server, float(topo.cpu[server]))
                 place.append(len(route) - 1)
                 sub_vnf_list.pop(0)
-            for edge in pairwise(route):
-                topo.edges.get(edge)['bandwidth'] -= sfc.throughput
+            route_edges = topo.route_edges(route)
+            for eid in route_edges:
+                topo.bandwidth[eid] -= sfc.throughput
 
             tp = sfc.throughput
             if config.state == config.Setting.parabox_naive:
@@ -329,24 +607,23 @@ def generate_configuration_greedy_dfs(topo: nx.Graph, sfc: SFC, origin_sfc: SFC
                                  origin_sfc.pa.opt_strategy[:])
 
             sub_sfc = SFC(sub_vnf_list, sfc.latency - route_latency,
-                          tp, server, sfc.d, sfc.idx)
+                          tp, topo.names[server], sfc.d, sfc.idx)
             sub_configuration = generate_configuration_greedy_dfs(
-                topo, sub_sfc, origin_sfc=origin_sfc, deep=max(int(deep / 2), 1), debug=debug)
+                topo, sub_sfc, origin_sfc=origin_sfc, deep=max(int(deep / 2), 1), debug=debug, index=index)
 
             # back
-            for edge in pairwise(route):
-                topo.edges.get(edge)['bandwidth'] += sfc.throughput
-            topo.nodes[server]['computing_resource'] += placed_res
+            for eid in route_edges:
+                topo.bandwidth[eid] += sfc.throughput
+            topo.cpu[server] += placed_res
+            index.set(server, float(topo.cpu[server]))
 
             if sub_configuration:
-                for i in range(len(sub_configuration.place)):
-                    sub_configuration.place[i] += (len(route) - 1)
-                place.extend(sub_configuration.place)
+                place.extend(sub_place + len(route) - 1 for sub_place in sub_configuration.place)
                 route.extend(sub_configuration.route[1:])
                 route_latency += sub_configuration.route_latency
                 if debug:
                     print('SUB', sub_sfc)
-                return Configuration(sfc, route, place, route_latency, 0)
+                return Configuration(topo, sfc, route, place, route_latency, 0)
 
     return None
 
@@ -373,27 +650,295 @@ def _tp_parabox(cut, strategy):
     return ret
 
 
-def _bfs_route_general(topo: nx.Graph, s, d, tp) -> (List, float):
-    queue = [([s], 0)]
-    passed_nodes = [s]
-
+def _bfs_route_general(topo: CompiledTopology, s: int, d: int, tp) -> (List[int], float):
+    """
+    Route from s to d on the edges with more than tp bandwidth and its latency, [], 0 if none:
+    the first one of fewest hops in the order of topo.adj, or of least latency for config.ROUTING 'latency'.
+    """
+    if config.ROUTING == 'latency':
+        router.sync(topo)
+        route, latency, _ = router.route(topo.bandwidth, s, d, tp)
+        return route, latency
+
+    parents = {s: None}
+    latencies = {s: 0}
+    queue = deque([s])
     while queue:
-        route, latency = queue.pop(0)
-        cur_node = route[-1]
-
+        cur_node = queue.popleft()
         if cur_node == d:
-            return route, latency
+            route = []
+            while cur_node is not None:
+                route.append(cur_node)
+                cur_node = parents[cur_node]
+            route.reverse()
+            return route, latencies[d]
+        for adj_node, eid in topo.adj[cur_node]:
+            if adj_node in parents or topo.bandwidth[eid] <= tp:
+                continue
+            parents[adj_node] = cur_node
+            latencies[adj_node] = latencies[cur_node] + topo.latency[eid]
+            queue.append(adj_node)
+
+    return [], 0
+
+
+# column generation
+
+def _distance_to(topo: CompiledTopology, d: int, weights) -> List[float]:
+    """Least total edge weight from every node to d, a lower bound for the rest of any route."""
+    ret = [sys.maxsize] * topo.n
+    heap = [(0, d)]
+    while heap:
+        distance, node = heapq.heappop(heap)
+        if ret[node] <= distance:
+            continue
+        ret[node] = distance
+        for adj_node, eid in topo.adj[node]:
+            if ret[adj_node] == sys.maxsize:
+                heapq.heappush(heap, (distance + weights[eid], adj_node))
+    return ret
+
+
+def _group_latency(sfc: SFC) -> List[List[float]]:
+    """
+    latency[k][j]: latency of vnf_list[k:j] placed on one server.
+    latency[k][m] of the whole suffix is a lower bound of the suffix however it is split.
+    """
+    m = len(sfc.vnf_list)
+    latency = [[0.0] * (m + 1) for k in range(m + 1)]
+    for k in range(m):
+        for j in range(k + 1, m + 1):
+            if config.state == config.Setting.flexchain:
+                latency[k][j] = pa_cache.get(sfc.vnf_list[k:j]).opt_latency
+            elif config.state == config.Setting.nfp_naive:
+                # the whole chain on one server
+                latency[k][j] = sfc.pa.opt_latency if (k, j) == (0, m) else sys.maxsize
+            elif config.state == config.Setting.parabox_naive:
+                # the optimum of the whole chain however it is split
+                latency[k][j] = sfc.pa.opt_latency if k == 0 else 0
+            else:
+                latency[k][j] = sum(vnf.latency for vnf in sfc.vnf_list[k:j])
+    return latency
+
+
+def _cost_to_go(topo: CompiledTopology, sfc: SFC, cr_duals: List[float], tp_duals: List[float],
+                cpu: List[float], bandwidth: List[float], cpu_prefix: List[int]) -> List[List[float]]:
+    """
+    cost[k][node]: least dual cost from a label (node, k vnfs placed) to d, ignoring the latency and the single use
+    of a server, a lower bound of the cost still to pay. Computed backwards from k = m by one dijkstra per k.
+    """
+    d = topo.index[sfc.d]
+    m = len(sfc.vnf_list)
+    tp = sfc.throughput
+    inf = float('inf')
+    cr_duals_array = numpy.asarray(cr_duals)
+    cost = [[inf] * topo.n for k in range(m + 1)]
+    cost_arrays = [None] * (m + 1)
+    for k in range(m, -1, -1):
+        # arrival[node]: least cost from arriving at node with k vnfs placed
+        if k == m:
+            arrival = [inf] * topo.n
+            cost[k][d] = arrival[d] = 0
         else:
-            adjacent_nodes = topo[cur_node]
-            for adj_node in adjacent_nodes:
-                if adj_node in passed_nodes:
-                    continue
-                if topo[cur_node][adj_node]['bandwidth'] <= tp:
+            arrival_array = numpy.full(topo.n, inf)
+            for j in range(k + 1, m + 1):
+                usage = cpu_prefix[j] - cpu_prefix[k]
+                arrival_array = numpy.minimum(arrival_array, numpy.where(
+                    topo.cpu >= usage, cr_duals_array * usage + cost_arrays[j], inf))
+            arrival = arrival_array.tolist()
+        heap = [(c, node) for node, c in enumerate(arrival) if c < inf]
+        heapq.heapify(heap)
+        while heap:
+            c, node = heapq.heappop(heap)
+            if c > arrival[node]:
+                continue
+            for adj_node, eid in topo.adj[node]:
+                if bandwidth[eid] < tp:
                     continue
-                passed_nodes.append(adj_node)
-                new_route = route[:]
-                new_route.append(adj_node)
-                queue.append(
-                    (new_route, latency + adjacent_nodes[adj_node]['latency']))
+                adj_cost = c + tp * tp_duals[eid]
+                if adj_cost < cost[k][adj_node]:
+                    cost[k][adj_node] = adj_cost
+                    # servers other than d are not relays
+                    if (cpu[adj_node] <= 0 or adj_node == d) and adj_cost < arrival[adj_node]:
+                        arrival[adj_node] = adj_cost
+                        heapq.heappush(heap, (adj_cost, adj_node))
+        cost_arrays[k] = numpy.array(cost[k])
+    return cost
+
+
+def _price_configuration(topo: CompiledTopology, sfc: SFC, cr_duals: List[float], tp_duals: List[float],
+                         threshold: float, latency_to_d: List[float], idx, exact: bool = False) -> Configuration:
+    """
+    Pricing: the valid configuration of sfc with the least dual cost
+    sum(cr_duals[node] * usage) + sum(tp_duals[eid] * throughput * count), if it is below threshold.
+
+    A* over labels (node, k vnfs placed) with the bound of _cost_to_go. A label is only extended within the
+    capacities (each server visited once, each edge used within its bandwidth). Equal bounds are popped by their
+    latency lower bound, then the longest first, and a label is dropped when its state was already popped with
+    a lower latency.
+    The state is (node, k), which ignores the servers and edges already used: a cheaper configuration may be
+    missed when the popped label has used up what it needs. If exact, the state also holds the servers visited
+    and the edges used, so the first label reaching d with every vnf placed is the cheapest, at a much larger cost.
+    As in the enumeration, servers other than d are never relays, each one on the route hosts a segment of vnfs.
+    """
+    s = topo.index[sfc.s]
+    d = topo.index[sfc.d]
+    m = len(sfc.vnf_list)
+    tp = sfc.throughput
+    group_latency = _group_latency(sfc)
+    cpu_prefix = [0, *itertools.accumulate(vnf.computing_resource for vnf in sfc.vnf_list)]
+    # python floats are much faster than numpy scalars here
+    cpu = topo.cpu.tolist()
+    bandwidth = topo.bandwidth.tolist()
+    edge_latency = topo.latency.tolist()
+    cost_to_go = _cost_to_go(topo, sfc, cr_duals, tp_duals, cpu, bandwidth, cpu_prefix)
+
+    # label: (node, k, parent label, eid from the parent, k of the parent, servers visited, sorted eids used)
+    labels = []
+    heap = []
+    settled = {}
+
+    def push(cost, latency, node, k, parent, eid, last_k, servers, edges):
+        cost_bound = cost + cost_to_go[k][node]
+        latency_bound = latency + group_latency[k][m] + latency_to_d[node]
+        if cost_bound >= threshold or latency_bound > sfc.latency:
+            return
+        if settled.get((node, k, servers, edges) if exact else (node, k), sys.maxsize) <= latency:
+            return
+        labels.append((node, k, parent, eid, last_k, servers, edges))
+        heapq.heappush(heap, (cost_bound, latency_bound, -latency, cost, len(labels) - 1))
+
+    def push_arrival(cost, latency, node, k, parent, eid, servers, edges):
+        # a server is used once
+        if cpu[node] > 0 and node not in servers:
+            servers = servers | {node}
+            for j in range(k + 1, m + 1):
+                usage = cpu_prefix[j] - cpu_prefix[k]
+                if usage > cpu[node]:
+                    break
+                push(cost + cr_duals[node] * usage, latency + group_latency[k][j], node, j, parent, eid, k,
+                     servers, edges)
+        if cpu[node] <= 0 or node == d:
+            push(cost, latency, node, k, parent, eid, k, servers, edges)
+
+    push_arrival(0, 0, s, 0, None, None, frozenset(), ())
+    while heap:
+        cost_bound, latency_bound, latency, cost, label = heapq.heappop(heap)
+        latency = -latency
+        node, k, parent, eid, last_k, servers, edges = labels[label]
+        state = (node, k, servers, edges) if exact else (node, k)
+        if settled.get(state, sys.maxsize) <= latency:
+            continue
+
+        if node == d and k == m:
+            configuration = _label_configuration(topo, sfc, labels, label, idx)
+            if configuration is not None:
+                return configuration
+            continue
+        settled[state] = latency
+
+        for adj_node, eid in topo.adj[node]:
+            if bandwidth[eid] < tp * (edges.count(eid) + 1):
+                continue
+            adj_edges = list(edges)
+            bisect.insort(adj_edges, eid)
+            push_arrival(cost + tp_duals[eid] * tp, latency + edge_latency[eid], adj_node, k, label, eid,
+                         servers, tuple(adj_edges))
 
-    return [], 0
+    return None
+
+
+def _label_configuration(topo: CompiledTopology, sfc: SFC, labels, label: int, idx) -> Configuration:
+    chain = []
+    while label is not None:
+        chain.append(labels[label])
+        label = labels[label][2]
+    chain.reverse()
+
+    route = []
+    place = []
+    route_latency = 0
+    for pos, (node, k, parent, eid, last_k, servers, edges) in enumerate(chain):
+        route.append(node)
+        place.extend([pos] * (k - last_k))
+        if eid is not None:
+            route_latency += topo.latency[eid]
+
+    configuration = Configuration(topo, sfc, route, place, route_latency, idx)
+    if configuration.get_latency() > sfc.latency:
+        return None
+    if any(usage > topo.cpu[node] for node, usage in configuration.computing_resource.items()):
+        return None
+    if any(sfc.throughput * count > topo.bandwidth[eid] for eid, count in configuration.edges.items()):
+        return None
+    return configuration
+
+
+def column_generation(model: Model) -> IncrementalPlacementLP:
+    """
+    Solve the LP of linear_programming by column generation.
+    Start from the cheapest configuration of each sfc and, after every solve of the restricted master LP,
+    add for each sfc the configuration of negative reduced cost 1 - u_sfc - dual cost found by _price_configuration.
+    When it finds none, an exact pricing pass over every sfc either adds columns and the generation goes on,
+    or certifies the objective is the optimum of the LP (up to CG_EPSILON, unless CG_MAX_ITERATION is reached).
+    The new columns are added to one IncrementalPlacementLP, which is returned.
+    sfc.configurations hold the generated columns, their varValue is set by the last solve.
+    """
+    topo = model.compiled
+    edge_latency = topo.latency.tolist()
+    latency_to = {}
+    for sfc in model.sfc_list:
+        sfc.configurations = []
+        sfc.pool = None
+        d = topo.index[sfc.d]
+        if d not in latency_to:
+            latency_to[d] = _distance_to(topo, d, edge_latency)
+
+    # zero duals: every valid configuration prices 1
+    cr_duals = [0] * topo.n
+    tp_duals = [0] * topo.m
+    for sfc in model.sfc_list:
+        configuration = _price_configuration(topo, sfc, cr_duals, tp_duals, 1, latency_to[topo.index[sfc.d]], 0)
+        if configuration:
+            sfc.configurations.append(configuration)
+
+    lp = IncrementalPlacementLP(topo)
+    lp.add_sfcs(model.sfc_list)
+    exact_passes = 0
+    for iteration in itertools.count(1):
+        lp.solve()
+        if iteration >= config.CG_MAX_ITERATION:
+            break
+
+        # clip the solver noise, the pricing needs non negative costs
+        duals = numpy.maximum(lp.duals, 0)
+        cr_duals = duals[lp.cr_offset:lp.tp_offset].tolist()
+        tp_duals = duals[lp.tp_offset:lp.basic_offset].tolist()
+        basic_duals = duals[lp.basic_offset:].tolist()
+        added = _add_columns(topo, lp, basic_duals, cr_duals, tp_duals, latency_to, False)
+        if not added:
+            exact_passes += 1
+            added = _add_columns(topo, lp, basic_duals, cr_duals, tp_duals, latency_to, True)
+            if not added:
+                break
+
+    print("CG iterations: {}\texact pricing passes: {}\tcolumns: {}".format(iteration, exact_passes, len(lp.columns)))
+    return lp
+
+
+def _add_columns(topo: CompiledTopology, lp: IncrementalPlacementLP, basic_duals: List[float], cr_duals: List[float],
+                 tp_duals: List[float], latency_to: dict, exact: bool) -> int:
+    """Price each sfc of lp and add its configuration found, if any, returns the number of them"""
+    added = 0
+    for row, sfc in enumerate(lp.sfc_list):
+        # an sfc without a configuration found at zero duals is only priced again by the exact pricing
+        if not sfc.configurations and not exact:
+            continue
+        threshold = 1 - basic_duals[row] - config.CG_EPSILON
+        configuration = _price_configuration(topo, sfc, cr_duals, tp_duals, threshold,
+                                             latency_to[topo.index[sfc.d]], len(sfc.configurations), exact)
+        if configuration:
+            sfc.configurations.append(configuration)
+            lp.add_configurations(sfc, [configuration])
+            added += 1
+    return added
@@ -30,6 +30,66 @@ K = 8000
 K_MIN = 128
 
 GC_BFS = False
+# generate the K configurations of least latency first (best-first search) instead of permuting the servers
+GC_BEST_FIRST = False
+# number of processes generating configurations, 0 for one per cpu
+GC_WORKERS = 1
+
+# ParaAnalyzer: dynamic programming (True) or exhaustive dfs (False)
+PA_DP = True
+# max number of vnf segments kept in model.pa_cache
+PA_CACHE_SIZE = 65536
+# max number of sources whose shortest path latencies are kept by a topology.ServerIndex
+SERVER_LATENCY_CACHE_SIZE = 256
+
+# presolve of linear_programming: reject the sfcs without feasible configuration and tighten their candidate servers
+# before the generation, drop the duplicate and the dominated configurations before building the LP
+LP_PRESOLVE = False
+
+# ROR: the LP of each sub model keeps the configurations of its parent fitting in the residual capacities (True)
+# instead of generating all of them again
+ROR_REUSE = False
+# ROR_REUSE: an sfc keeping less than this fraction of its configurations generates new ones, 0 to only reuse them
+ROR_TOP_UP = 0
+
+# LP solver of linear_programming: 'pulp' (CBC through PuLP), 'highs' (scipy, in process)
+# or 'packing' (multiplicative weights, within 1 - LP_EPSILON of the optimum)
+LP_SOLVER = 'pulp'
+LP_EPSILON = 0.1
+# LP_SOLVER 'highs': solve the independent blocks of the LP (groups of sfcs sharing no node or edge) apart
+LP_BLOCKS = False
+# number of processes solving the blocks, 0 for one per cpu
+LP_WORKERS = 1
+# LP_SOLVER 'highs' without LP_BLOCKS: the experiment scripts keep one LP, updated from one run of their sweep to the next
+LP_INCREMENTAL = False
+
+# ROR rounds by rounding_best_of instead of rounding_one
+ROUNDING_BEST_OF = False
+# rounding_best_of: number of rounding trials, the first one greedy and the others randomized
+ROUNDING_TRIALS = 8
+# number of processes running the trials, 0 for one per cpu
+ROUNDING_WORKERS = 1
+
+# placement search of PARC and greedy_dc: 'dfs' (generate_configuration_greedy_dfs) or 'beam' (beam search keeping
+# the GREEDY_BEAM_WIDTH best partial placements of each number of vnfs placed)
+GREEDY_SEARCH = 'dfs'
+GREEDY_BEAM_WIDTH = 4
+# 'beam': budget of each sfc, in route searches and in seconds
+GREEDY_BEAM_EXPANSIONS = 256
+GREEDY_BEAM_TIME = 0.1
+
+# route searches of the generators, of generate_configuration_greedy_dfs and of ParcEngine: 'bfs' (fewest hops, the
+# first in adjacency order) or 'latency' (least latency, A* with ROUTING_LANDMARKS landmarks, see routing.Router)
+ROUTING = 'bfs'
+ROUTING_LANDMARKS = 16
+# ROUTING 'latency': break the ties by the widest route (most bandwidth left on its least one)
+ROUTING_WIDEST = False
+
+# linear_programming: price configurations by column generation (True) instead of enumerating up to K of them
+COLUMN_GENERATION = False
+CG_MAX_ITERATION = 1000
+# least reduced cost of a new column
+CG_EPSILON = 1e-6
 
 
 class Setting(enum.Enum):
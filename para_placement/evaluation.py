@@ -1,3 +1,5 @@
+import numpy
+
 from para_placement.model import Model
 
 
@@ -9,21 +11,23 @@ def evaluate(model: Model) -> bool:
         if sfc.accepted_configuration.get_latency() > sfc.latency:
             return False
 
+    topo = model.compiled
+
     # computing resource constraints
-    for index, info in model.topo.nodes.data():
-        usage = sum(sfc.accepted_configuration.computing_resource[index]
-                    for sfc in accepted_sfc_list
-                    if index in sfc.accepted_configuration.computing_resource)
-        if usage > info['computing_resource']:
-            return False
+    usage = numpy.zeros(topo.n)
+    for sfc in accepted_sfc_list:
+        for node, cpu in sfc.accepted_configuration.computing_resource.items():
+            usage[node] += cpu
+    if (usage > topo.cpu).any():
+        return False
 
     # throughput constraints
-    for start, end, info in model.topo.edges.data():
-        usage = sum(sfc.throughput * sfc.accepted_configuration.edges[(start, end)]
-                    for sfc in accepted_sfc_list
-                    if (start, end) in sfc.accepted_configuration.edges)
-        if usage > info['bandwidth']:
-            return False
+    usage = numpy.zeros(topo.m)
+    for sfc in accepted_sfc_list:
+        for eid, count in sfc.accepted_configuration.edges.items():
+            usage[eid] += sfc.throughput * count
+    if (usage > topo.bandwidth).any():
+        return False
 
     return True
 
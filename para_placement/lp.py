@@ -0,0 +1,397 @@
+# placement LP in sparse matrix form, solved in process by HiGHS
+
+import itertools
+import math
+import multiprocessing
+
+import numpy
+import scipy.sparse
+from scipy.optimize import linprog
+from scipy.sparse.csgraph import connected_components
+
+from para_placement.model import *
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+
+def _column_entries(sfc: SFC, configurations: list, basic_row: int, cr_offset: int, tp_offset: int) -> tuple:
+    """
+    Entries of the columns of configurations (of sfc) in CSC form: (lengths, rows, values).
+    The entries of a column are Basic_* (row basic_row), then CR_*, then TP_*.
+    The footprints are gathered from the arrays of the configuration pools, one pool at a time.
+    """
+    rows, columns, values = [], [], []
+    start = 0
+    for pool, group in itertools.groupby(configurations, key=lambda c: c.pool):
+        group = list(group)
+        group_columns = numpy.arange(start, start + len(group))
+        start += len(group)
+        cpu_lengths, cpu_nodes, cpu_usage, edge_lengths, edge_eids, edge_counts = pool.footprints(
+            numpy.fromiter((c.row for c in group), dtype=int, count=len(group)))
+        rows += [numpy.full(len(group), basic_row), cr_offset + cpu_nodes, tp_offset + edge_eids]
+        columns += [group_columns, numpy.repeat(group_columns, cpu_lengths), numpy.repeat(group_columns, edge_lengths)]
+        values += [numpy.ones(len(group)), cpu_usage, sfc.throughput * edge_counts]
+
+    columns = numpy.concatenate(columns or [numpy.zeros(0, dtype=int)])
+    order = numpy.argsort(columns, kind='stable')
+    return (numpy.bincount(columns, minlength=start), numpy.concatenate(rows or [numpy.zeros(0, dtype=int)])[order],
+            numpy.concatenate(values or [numpy.zeros(0)]).astype(float)[order])
+
+
+def _set_values(columns: list, x: numpy.ndarray):
+    """Set configuration.varValue of the columns, snapping the solver noise: rounding_one looks for varValue == 1"""
+    x = numpy.clip(x, 0, 1)
+    integral = numpy.round(x)
+    x = numpy.where(numpy.abs(x - integral) < 1e-9, integral, x)
+    for configuration, var_value in zip(columns, x.tolist()):
+        configuration.varValue = var_value
+
+
+class PlacementLP(BaseObject):
+    """
+    max sum(x) s.t. A x <= b, 0 <= x <= 1
+
+    Columns are the configurations of model.sfc_list. Rows are the constraints of linear_programming:
+    Basic_* (one per sfc), then CR_* (one per node), then TP_* (one per edge).
+    The resource footprint of each configuration is one CSR row of A^T, A is its transpose.
+    """
+
+    def __init__(self, model: Model):
+        topo = model.compiled
+        self.n_sfc = len(model.sfc_list)
+        self.cr_offset = self.n_sfc
+        self.tp_offset = self.cr_offset + topo.n
+        self.n_rows = self.tp_offset + topo.m
+
+        self.columns = []
+        lengths, indices, data = [], [], []
+        for row, sfc in enumerate(model.sfc_list):
+            sfc_lengths, sfc_indices, sfc_data = _column_entries(
+                sfc, sfc.configurations, row, self.cr_offset, self.tp_offset)
+            self.columns.extend(sfc.configurations)
+            lengths.append(sfc_lengths)
+            indices.append(sfc_indices)
+            data.append(sfc_data)
+
+        indptr = numpy.concatenate(([0], numpy.cumsum(numpy.concatenate(lengths or [numpy.zeros(0, dtype=int)]))))
+        footprints = scipy.sparse.csr_matrix(
+            (numpy.concatenate(data or [numpy.zeros(0)]), numpy.concatenate(indices or [numpy.zeros(0, dtype=int)]),
+             indptr), shape=(len(self.columns), self.n_rows))
+        self.A = footprints.T.tocsc()
+        # residual capacities may be slightly negative after float rounding
+        self.b = numpy.maximum(numpy.concatenate((numpy.ones(self.n_sfc), topo.cpu, topo.bandwidth)), 0)
+
+        self.objective = None
+        self.duals = None
+        # number of blocks solved apart by the last solve
+        self.n_blocks = 1
+        # upper bound of the optimum found by the last solve_packing
+        self.bound = None
+
+    def __str__(self):
+        return "<PlacementLP> rows: {}\tcolumns: {}\tnon zeros: {}".format(
+            self.n_rows, len(self.columns), self.A.nnz)
+
+    def blocks(self) -> List[tuple]:
+        """
+        Independent blocks of the LP, the connected components of the graph linking each column to the rows of
+        its non zeros: (rows, columns) of each block with columns, largest first.
+        The sfcs of different blocks share no node or edge through their configurations.
+        """
+        n_columns = len(self.columns)
+        entries = self.A.tocoo()
+        graph = scipy.sparse.coo_matrix((numpy.ones(entries.nnz), (entries.row, self.n_rows + entries.col)),
+                                        shape=(self.n_rows + n_columns, self.n_rows + n_columns))
+        _, labels = connected_components(graph, directed=False)
+        rows_of = _group_by_label(labels[:self.n_rows])
+        columns_of = _group_by_label(labels[self.n_rows:])
+        blocks = [(rows_of[label], columns) for label, columns in columns_of.items()]
+        blocks.sort(key=lambda block: len(block[1]), reverse=True)
+        return blocks
+
+    def solve(self, blocks: bool = False, workers: int = 1) -> float:
+        """
+        Solve with HiGHS, set configuration.varValue and return the objective value.
+        blocks: solve each of self.blocks() apart, in a pool of workers processes if workers > 1
+        """
+        if not self.columns:
+            self.objective = 0
+            self.duals = numpy.zeros(self.n_rows)
+            return self.objective
+
+        if not blocks:
+            x, self.objective, self.duals = _solve_block(self.A, self.b)
+            _set_values(self.columns, x)
+            return self.objective
+
+        block_list = self.blocks()
+        self.n_blocks = len(block_list)
+        tasks = [(self.A[:, columns][rows, :], self.b[rows]) for rows, columns in block_list]
+        if workers > 1 and len(tasks) > 1:
+            with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+                results = pool.starmap(_solve_block, tasks, chunksize=1)
+        else:
+            results = [_solve_block(A, b) for A, b in tasks]
+
+        x = numpy.zeros(len(self.columns))
+        self.objective = 0
+        # rows out of every block bind no column
+        self.duals = numpy.zeros(self.n_rows)
+        for (rows, columns), (block_x, block_objective, block_duals) in zip(block_list, results):
+            x[columns] = block_x
+            self.objective += block_objective
+            self.duals[rows] = block_duals
+        _set_values(self.columns, x)
+        return self.objective
+
+    def solve_packing(self, epsilon: float) -> float:
+        """
+        (1 - epsilon)-approximate solve by the multiplicative weights of Garg and Koenemann,
+        set configuration.varValue and return the objective value.
+
+        The rows have weights y, the length of a column is its weighted footprint A^T y.
+        Each step pushes all the columns within 1 + epsilon of the least length until a row is full,
+        and multiplies the weight of each row by 1 + epsilon * its share of that push.
+        x scaled down to fit in b is feasible, y scaled up so that every column has length 1 is feasible in the dual:
+        the solve stops when the best of them are within 1 - epsilon of each other, or the weights reach 1.
+        self.bound is the best dual objective, self.duals its y (0 on the rows without capacity).
+        """
+        x = numpy.zeros(len(self.columns))
+        self.duals = numpy.zeros(self.n_rows)
+        # the columns using a row without capacity stay at 0
+        rows = self.b > 0
+        columns = numpy.flatnonzero(self.A.T @ (~rows).astype(float) == 0)
+        if len(columns) == 0:
+            _set_values(self.columns, x)
+            self.objective = self.bound = 0
+            return self.objective
+        A = self.A[:, columns][rows, :]
+        At = A.T.tocsr()
+        b = self.b[rows]
+
+        # y starts at delta / b and is kept normalized, b y = 1, log_d is the log of its scale
+        m = len(b)
+        log_delta = math.log(1 + epsilon) - math.log((1 + epsilon) * m) / epsilon
+        log_d = math.log(m) + log_delta
+        y = 1 / b / m
+        x_sub = numpy.zeros(len(columns))
+        load = numpy.zeros(m)
+        best_x, self.objective, self.bound = x_sub, 0, math.inf
+        while log_d < 0:
+            lengths = At @ y
+            alpha = lengths.min()
+            if 1 / alpha < self.bound:
+                self.bound = 1 / alpha
+                self.duals[rows] = y / alpha
+
+            pushed = (lengths <= alpha * (1 + epsilon)).astype(float)
+            unit = A @ pushed
+            step = (b[unit > 0] / unit[unit > 0]).min()
+            x_sub += step * pushed
+            load += step * unit
+            scale = (load / b).max()
+            if x_sub.sum() / scale > self.objective:
+                best_x, self.objective = x_sub / scale, x_sub.sum() / scale
+            if self.objective >= (1 - epsilon) * self.bound:
+                break
+
+            y *= 1 + epsilon * step * unit / b
+            d = b @ y
+            y /= d
+            log_d += math.log(d)
+
+        x[columns] = best_x
+        _set_values(self.columns, x)
+        return self.objective
+
+
+def _group_by_label(labels: numpy.ndarray) -> dict:
+    """Indices of each label of labels, in increasing order"""
+    order = numpy.argsort(labels, kind='stable')
+    splits = numpy.flatnonzero(numpy.diff(labels[order])) + 1
+    return {labels[indices[0]]: indices for indices in numpy.split(order, splits)}
+
+
+def _solve_block(A: scipy.sparse.spmatrix, b: numpy.ndarray) -> (numpy.ndarray, float, numpy.ndarray):
+    """max sum(x) s.t. A x <= b, 0 <= x <= 1 by HiGHS: (x, objective value, shadow prices of the rows)"""
+    result = linprog(-numpy.ones(A.shape[1]), A_ub=A, b_ub=b, bounds=(0, 1), method='highs')
+    if result.status != 0:
+        raise RuntimeError("HiGHS: {}".format(result.message))
+    # shadow prices of the maximization, >= 0
+    return result.x, -result.fun, -result.ineqlin.marginals
+
+
+def _configuration_key(configuration) -> tuple:
+    return tuple(configuration.route), tuple(configuration.place)
+
+
+class IncrementalPlacementLP(BaseObject):
+    """
+    The LP of PlacementLP kept from one solve to the next, for the sweeps over K or over the sfcs and the online
+    batches: sfcs (a Basic_* row and the columns of their configurations) are added and removed,
+    the capacities of the CR_* and TP_* rows are changed, and HiGHS (highspy) starts the next solve from its last basis.
+    Without highspy, each solve builds the matrix of the current columns and solves it with scipy.
+
+    Rows: CR_* (one per node), then TP_* (one per edge), then Basic_* in the order the sfcs were added.
+    """
+
+    def __init__(self, topo: CompiledTopology):
+        self.cr_offset = 0
+        self.tp_offset = topo.n
+        self.basic_offset = topo.n + topo.m
+        self.capacities = numpy.maximum(numpy.concatenate((topo.cpu, topo.bandwidth)), 0)
+
+        self.sfc_list = []
+        # (sfc, key, configuration) of each column, in column order
+        self.columns = []
+
+        self.objective = None
+        self.duals = None
+
+        self.highs = None
+        if highspy is not None:
+            self.highs = highspy.Highs()
+            self.highs.setOptionValue('output_flag', False)
+            # the primal simplex restarts from the last basis, which stays primal feasible when columns are added
+            self.highs.setOptionValue('solver', 'simplex')
+            self.highs.setOptionValue('simplex_strategy', 4)
+            self.highs.changeObjectiveSense(highspy.ObjSense.kMaximize)
+            n_rows = len(self.capacities)
+            self.highs.addRows(n_rows, numpy.full(n_rows, -highspy.kHighsInf), self.capacities,
+                               0, numpy.zeros(n_rows, dtype=numpy.int32), numpy.zeros(0, dtype=numpy.int32),
+                               numpy.zeros(0))
+
+    def __str__(self):
+        return "<IncrementalPlacementLP> sfcs: {}\tcolumns: {}\thighspy: {}".format(
+            len(self.sfc_list), len(self.columns), self.highs is not None)
+
+    def set_capacities(self, cpu: numpy.ndarray, bandwidth: numpy.ndarray):
+        """Capacities of the CR_* and TP_* rows."""
+        capacities = numpy.maximum(numpy.concatenate((cpu, bandwidth)), 0)
+        changed = numpy.flatnonzero(capacities != self.capacities)
+        self.capacities = capacities
+        if self.highs is not None and len(changed):
+            self.highs.changeRowsBounds(len(changed), changed.astype(numpy.int32),
+                                        numpy.full(len(changed), -highspy.kHighsInf), capacities[changed])
+
+    def add_sfcs(self, sfc_list: List[SFC]):
+        """Add a Basic_* row and the columns of sfc.configurations for each sfc of sfc_list."""
+        if self.highs is not None and sfc_list:
+            self.highs.addRows(len(sfc_list), numpy.full(len(sfc_list), -highspy.kHighsInf),
+                               numpy.ones(len(sfc_list)), 0, numpy.zeros(len(sfc_list), dtype=numpy.int32),
+                               numpy.zeros(0, dtype=numpy.int32), numpy.zeros(0))
+        self.sfc_list.extend(sfc_list)
+        for sfc in sfc_list:
+            self.add_configurations(sfc, sfc.configurations)
+
+    def add_configurations(self, sfc: SFC, configurations: list):
+        """Add the columns of configurations of sfc, an sfc of the LP."""
+        if not configurations:
+            return
+        if self.highs is not None:
+            lengths, rows, values = _column_entries(
+                sfc, configurations, self.basic_offset + self.sfc_list.index(sfc), self.cr_offset, self.tp_offset)
+            starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+            self.highs.addCols(len(configurations), numpy.ones(len(configurations)), numpy.zeros(len(configurations)),
+                               numpy.ones(len(configurations)), len(rows), starts.astype(numpy.int32),
+                               rows.astype(numpy.int32), values)
+        self.columns.extend((sfc, _configuration_key(c), c) for c in configurations)
+
+    def _remove_columns(self, removed: List[bool]):
+        if self.highs is not None and any(removed):
+            self.highs.deleteCols(sum(removed), numpy.flatnonzero(removed).astype(numpy.int32))
+        self.columns = [column for column, remove in zip(self.columns, removed) if not remove]
+
+    def remove_sfcs(self, sfc_list: List[SFC]):
+        """Remove the Basic_* rows and the columns of the sfcs of sfc_list."""
+        sfc_set = set(sfc_list)
+        self._remove_columns([sfc in sfc_set for sfc, _, _ in self.columns])
+        removed = [sfc in sfc_set for sfc in self.sfc_list]
+        if self.highs is not None and any(removed):
+            self.highs.deleteRows(sum(removed), (self.basic_offset + numpy.flatnonzero(removed)).astype(numpy.int32))
+        self.sfc_list = [sfc for sfc, remove in zip(self.sfc_list, removed) if not remove]
+
+    def sync(self, model: Model):
+        """
+        Make the LP the one of linear_programming(model) over the configurations the sfcs of model have now.
+        The configurations are matched to the columns by their route and place,
+        only the columns of the configurations an sfc does not have any more are removed, and the new ones added.
+        """
+        topo = model.compiled
+        self.set_capacities(topo.cpu, topo.bandwidth)
+
+        sfc_set = set(model.sfc_list)
+        self.remove_sfcs([sfc for sfc in self.sfc_list if sfc not in sfc_set])
+
+        column_ids = {sfc: set() for sfc in self.sfc_list}
+        for sfc, _, configuration in self.columns:
+            column_ids[sfc].add(id(configuration))
+        current = {}
+        for sfc in self.sfc_list:
+            if {id(configuration) for configuration in sfc.configurations} != column_ids[sfc]:
+                current[sfc] = {}
+                for configuration in sfc.configurations:
+                    current[sfc].setdefault(_configuration_key(configuration), []).append(configuration)
+
+        # the kept columns of the changed sfcs stand for their configurations of now
+        columns = []
+        removed = []
+        for column in self.columns:
+            sfc, key, _ = column
+            if sfc not in current:
+                columns.append(column)
+                removed.append(False)
+                continue
+            configurations = current[sfc].get(key)
+            removed.append(not configurations)
+            if configurations:
+                columns.append((sfc, key, configurations.pop()))
+        self._remove_columns(removed)
+        self.columns = columns
+        kept = {id(configuration) for _, _, configuration in columns}
+        for sfc in current:
+            self.add_configurations(sfc, [c for c in sfc.configurations if id(c) not in kept])
+
+        in_lp = set(self.sfc_list)
+        self.add_sfcs([sfc for sfc in model.sfc_list if sfc not in in_lp])
+
+    def _solve_scipy(self) -> (numpy.ndarray, float, numpy.ndarray):
+        lengths, indices, data = [], [], []
+        for sfc, group in itertools.groupby(self.columns, key=lambda column: column[0]):
+            sfc_lengths, sfc_indices, sfc_data = _column_entries(
+                sfc, [c for _, _, c in group], self.basic_offset + self.sfc_list.index(sfc), self.cr_offset,
+                self.tp_offset)
+            lengths.append(sfc_lengths)
+            indices.append(sfc_indices)
+            data.append(sfc_data)
+        indptr = numpy.concatenate(([0], numpy.cumsum(numpy.concatenate(lengths))))
+        A = scipy.sparse.csc_matrix((numpy.concatenate(data), numpy.concatenate(indices), indptr),
+                                    shape=(self.basic_offset + len(self.sfc_list), len(self.columns)))
+        b = numpy.concatenate((self.capacities, numpy.ones(len(self.sfc_list))))
+        result = linprog(-numpy.ones(len(self.columns)), A_ub=A, b_ub=b, bounds=(0, 1), method='highs')
+        if result.status != 0:
+            raise RuntimeError("HiGHS: {}".format(result.message))
+        return result.x, -result.fun, -result.ineqlin.marginals
+
+    def _solve_highs(self) -> (numpy.ndarray, float, numpy.ndarray):
+        self.highs.run()
+        status = self.highs.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError("HiGHS: {}".format(self.highs.modelStatusToString(status)))
+        solution = self.highs.getSolution()
+        return (numpy.array(solution.col_value), self.highs.getInfo().objective_function_value,
+                numpy.array(solution.row_dual))
+
+    def solve(self) -> float:
+        """Solve, set configuration.varValue and return the objective value."""
+        if not self.columns:
+            self.objective = 0
+            self.duals = numpy.zeros(self.basic_offset + len(self.sfc_list))
+            return self.objective
+
+        x, self.objective, self.duals = self._solve_highs() if self.highs is not None else self._solve_scipy()
+        _set_values([c for _, _, c in self.columns], x)
+        return self.objective
@@ -1,42 +1,78 @@
-import copy
 import heapq
+import math
 import pickle
 import random
 import string
+from array import array
+from collections import OrderedDict
 from typing import List
 
 import matplotlib.pyplot as plt
 import networkx as nx
+import numpy
+import scipy.sparse
 
 import para_placement.config as config
 from para_placement.config import SFC_CONFIG
 from para_placement.helper import pairwise
+from para_placement.topology import CompiledTopology, ResidualTopology, ServerIndex
 
 
 class BaseObject(object):
+    __slots__ = ()
+
     def __repr__(self):
         return self.__str__()
 
 
+def _fields_to_mask(fields) -> int:
+    mask = 0
+    if fields is not None:
+        for field in fields:
+            mask |= 1 << field
+    return mask
+
+
+def _mask_to_fields(mask: int) -> set:
+    return {field for field in range(mask.bit_length()) if mask >> field & 1}
+
+
 class VNF(BaseObject):
     def __init__(self, latency: float, computing_resource: int, read_fields: set = None, write_fields: set = None):
         self.latency = latency
         self.computing_resource = computing_resource
-        self.read_fields = set()
-        if read_fields is not None:
-            self.read_fields |= read_fields
-        self.write_fields = set()
-        if write_fields is not None:
-            self.write_fields |= write_fields
+        # header fields as bitmasks, bit i set <=> field i
+        self.read_mask = _fields_to_mask(read_fields)
+        self.write_mask = _fields_to_mask(write_fields)
+        # set by VNFCatalog, merged vnfs are not in any catalog
+        self.catalog = None
+        self.catalog_idx = -1
+
+    def __setstate__(self, state):
+        # vnfs pickled before the bitmask representation
+        if 'read_fields' in state:
+            state['read_mask'] = _fields_to_mask(state.pop('read_fields'))
+            state['write_mask'] = _fields_to_mask(state.pop('write_fields'))
+        state.setdefault('catalog', None)
+        state.setdefault('catalog_idx', -1)
+        self.__dict__.update(state)
 
     def __str__(self):
         return "(%f, %d, %s, %s)" % (self.latency, self.computing_resource, self.read_fields, self.write_fields)
 
+    @property
+    def read_fields(self) -> set:
+        return _mask_to_fields(self.read_mask)
+
+    @property
+    def write_fields(self) -> set:
+        return _mask_to_fields(self.write_mask)
+
     def para_merge(self, vnf):
         merged = VNF(max(self.latency, vnf.latency),
-                     self.computing_resource + vnf.computing_resource,
-                     set.union(self.read_fields, vnf.read_fields),
-                     set.union(self.write_fields, vnf.write_fields))
+                     self.computing_resource + vnf.computing_resource)
+        merged.read_mask = self.read_mask | vnf.read_mask
+        merged.write_mask = self.write_mask | vnf.write_mask
         return merged
 
     def can_run_in_parallel(self, vnf):
@@ -47,28 +83,16 @@ class VNF(BaseObject):
         1: don't need packet copy
         -1: cannot run in parallel
         """
-        nf1_read_fields = self.read_fields
-        nf1_write_fields = self.write_fields
-        nf2_read_fields = vnf.read_fields
-        nf2_write_fields = vnf.write_fields
+        if self.catalog_idx >= 0 and vnf.catalog_idx >= 0 and self.catalog is vnf.catalog:
+            return int(self.catalog.matrix[self.catalog_idx, vnf.catalog_idx])
 
         # analyze read after write
-        for fields1 in nf1_write_fields:
-            for fields2 in nf2_read_fields:
-                if fields1 == fields2:
-                    return -1  # cannot parallelism
-
-        # analyze write after read
-        for fields1 in nf1_read_fields:
-            for fields2 in nf2_write_fields:
-                if fields1 == fields2:
-                    return 0  # need packet copy
-
-        # analyze write after write
-        for fields1 in nf1_write_fields:
-            for fields2 in nf2_write_fields:
-                if fields1 == fields2:
-                    return 0  # need packet copy
+        if self.write_mask & vnf.read_mask:
+            return -1  # cannot parallelism
+
+        # analyze write after read & write after write
+        if self.read_mask & vnf.write_mask or self.write_mask & vnf.write_mask:
+            return 0  # need packet copy
 
         return 1  # perfect parallelism
 
@@ -76,12 +100,30 @@ class VNF(BaseObject):
 class SimpleVNF(VNF):
     def __init__(self, latency: float, computing_resource: int):
         VNF.__init__(self, latency, computing_resource)
+        # only used by simple vnfs out of any catalog
         self.paraDict = dict()
+        # can_run_in_parallel row of a merged vnf in the catalog
+        self.para_row = None
+
+    def __setstate__(self, state):
+        state.setdefault('para_row', None)
+        VNF.__setstate__(self, state)
+
+    def _para_row(self):
+        if self.catalog_idx >= 0:
+            return self.catalog.matrix[self.catalog_idx]
+        return self.para_row
 
     def para_merge(self, vnf):
         ret = SimpleVNF(max(self.latency, vnf.latency),
                         self.computing_resource + vnf.computing_resource)
 
+        if self.catalog is not None and self.catalog is vnf.catalog:
+            # a merged vnf runs in parallel with another one as bad as its worst part
+            ret.catalog = self.catalog
+            ret.para_row = numpy.minimum(self._para_row(), vnf._para_row())
+            return ret
+
         ret.paraDict = self.paraDict.copy()
         for key in vnf.paraDict:
             a = ret.paraDict[key]
@@ -98,11 +140,77 @@ class SimpleVNF(VNF):
         1: don't need packet copy
         -1: cannot run in parallel
         """
+        if self.catalog is not None and self.catalog is vnf.catalog and vnf.catalog_idx >= 0:
+            return int(self._para_row()[vnf.catalog_idx])
         if vnf in self.paraDict:
             return self.paraDict[vnf]
         return -1
 
 
+class VNFCatalog(BaseObject):
+    """
+    A set of vnfs with the pairwise can_run_in_parallel results precomputed.
+    matrix[i][j] is vnf_list[i].can_run_in_parallel(vnf_list[j]).
+    """
+
+    def __init__(self, vnf_list: List[VNF], matrix: numpy.ndarray = None):
+        self.vnf_list = vnf_list
+        for idx, vnf in enumerate(vnf_list):
+            vnf.catalog = self
+            vnf.catalog_idx = idx
+
+        if matrix is None:
+            matrix = self._field_matrix()
+        self.matrix = matrix
+
+    def __str__(self):
+        return "<VNFCatalog> vnfs: {}\tparallelizable pairs: {}".format(
+            len(self.vnf_list), numpy.count_nonzero(self.matrix >= 0))
+
+    def _field_matrix(self) -> numpy.ndarray:
+        n = len(self.vnf_list)
+        read, read_fields = _mask_incidence([vnf.read_mask for vnf in self.vnf_list])
+        write, write_fields = _mask_incidence([vnf.write_mask for vnf in self.vnf_list])
+        # only the header fields some vnf touches, numbered in order
+        fields = numpy.union1d(read_fields, write_fields)
+        read = _incidence_matrix(read, numpy.searchsorted(fields, read_fields), len(fields))
+        write = _incidence_matrix(write, numpy.searchsorted(fields, write_fields), len(fields))
+        read_t, write_t = read.T.tocsr(), write.T.tocsr()
+
+        matrix = numpy.ones((n, n), dtype=numpy.int8)
+        # number of rows per block, bounds the sparse products to a few n * 2^20 entries
+        block = max(1, (1 << 20) // max(n, 1))
+        for start in range(0, n, block):
+            end = min(start + block, n)
+            rows = matrix[start:end]
+            for product in (read[start:end] @ write_t, write[start:end] @ write_t):
+                rows[product.nonzero()] = 0
+            rows[(write[start:end] @ read_t).nonzero()] = -1
+        return matrix
+
+
+def _mask_incidence(masks: List[int]) -> (numpy.ndarray, numpy.ndarray):
+    """Bitmasks -> (start of each mask in fields, fields): the positions of the set bits of each mask in turn."""
+    lengths = [(mask.bit_length() + 7) // 8 for mask in masks]
+    offsets = numpy.concatenate(([0], numpy.cumsum(lengths, dtype=numpy.int64)))
+    data = numpy.frombuffer(b''.join(mask.to_bytes(length, 'little') for mask, length in zip(masks, lengths)),
+                            dtype=numpy.uint8)
+    # only the non zero bytes are unpacked
+    positions = numpy.flatnonzero(data)
+    entries, bits = numpy.unpackbits(data[positions][:, None], axis=1, bitorder='little').nonzero()
+    positions = positions[entries]
+    rows = numpy.searchsorted(offsets, positions, side='right') - 1
+    fields = (positions - offsets[rows]) * 8 + bits
+    indptr = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(rows, minlength=len(masks)))))
+    return indptr, fields
+
+
+def _incidence_matrix(indptr: numpy.ndarray, columns: numpy.ndarray, n_columns: int) -> scipy.sparse.csr_matrix:
+    """0/1 CSR matrix with the given columns set in each row"""
+    return scipy.sparse.csr_matrix((numpy.ones(len(columns), dtype=numpy.int32), columns, indptr),
+                                   shape=(len(indptr) - 1, n_columns))
+
+
 class SFC(BaseObject):
     def __init__(self, vnf_list: List[VNF], latency: float, throughput: int, s, d, idx: int):
         self.vnf_list = vnf_list
@@ -116,10 +224,14 @@ class SFC(BaseObject):
         self.computing_resources_sum: int = sum(
             vnf.computing_resource for vnf in vnf_list)
 
-        self.pa = ParaAnalyzer(self.vnf_list)
+        self.pa = pa_cache.get(self.vnf_list)
 
         self.configurations: List[Configuration] = []
         self.accepted_configuration: Configuration = None
+        # storage of the configurations, see ConfigurationPool
+        self.pool = None
+        # candidate servers left by the presolve, all the servers if None
+        self.servers: List[int] = None
 
     def __str__(self):
         return "({}, {}, {}, {}->{}, pa:{})".format(self.vnf_list, self.latency, self.throughput, self.s, self.d,
@@ -127,9 +239,20 @@ class SFC(BaseObject):
 
 
 class Model(BaseObject):
-    def __init__(self, topo: nx.Graph, sfc_list: List[SFC]):
+    def __init__(self, topo: nx.Graph, sfc_list: List[SFC], residual: ResidualTopology = None):
         self.topo = topo
         self.sfc_list = sfc_list
+        self._compiled = residual
+
+    @property
+    def compiled(self) -> ResidualTopology:
+        """
+        Residual capacities over the integer indexed topology, compiled on first use.
+        self.topo is shared with the sub models and never modified, it is only kept for reporting.
+        """
+        if self.__dict__.get('_compiled') is None:
+            self._compiled = CompiledTopology(self.topo).fork()
+        return self._compiled
 
     def __str__(self):
         return "<{}>\tState: {}\tnodes: {}\tservers: {}\tedges: {}\tSFCs: {}".format(
@@ -137,7 +260,8 @@ class Model(BaseObject):
             len(self.sfc_list))
 
     def servers(self):
-        return [n for n in self.topo.nodes if self.topo.nodes[n]['computing_resource'] > 0]
+        topo = self.compiled
+        return [topo.names[n] for n in topo.servers()]
 
     def save(self, filename='model_data.pkl'):
         with open(filename, 'wb') as output:
@@ -184,41 +308,45 @@ class Model(BaseObject):
     def get_accepted_sfc_list(self) -> List[SFC]:
         return list(filter(lambda s: s.accepted_configuration is not None, self.sfc_list))
 
+    def ledger(self):
+        """Residual resources left by the accepted sfcs."""
+        return ResourceLedger(self.compiled, self.get_accepted_sfc_list())
+
     def clear(self):
         for sfc in self.sfc_list:
             sfc.accepted_configuration = None
             sfc.configurations = []
+            sfc.pool = None
+            sfc.servers = None
 
     def print_resource_usages(self, node=True, edge=True):
         accepted_sfc_list = self.get_accepted_sfc_list()
+        topo = self.compiled
 
         if node:
-            for node in self.topo.nodes:
-                if self.topo.nodes[node]['computing_resource'] <= 0:
+            computing_resources = [sfc.accepted_configuration.computing_resource for sfc in accepted_sfc_list]
+            for node in range(topo.n):
+                if topo.cpu[node] <= 0:
                     continue
                 consumption = 0
-                for sfc in accepted_sfc_list:
-                    if node in sfc.accepted_configuration.computing_resource:
-                        consumption += sfc.accepted_configuration.computing_resource[node]
-                print(node, "{}/{}".format(consumption, self.topo.nodes[node]['computing_resource']),
-                      "{:.2f}%".format(consumption / self.topo.nodes[node]['computing_resource'] * 100))
+                for computing_resource in computing_resources:
+                    consumption += computing_resource.get(node, 0)
+                print(topo.names[node], "{}/{}".format(consumption, topo.cpu[node]),
+                      "{:.2f}%".format(consumption / topo.cpu[node] * 100))
 
         if edge:
-            for start, end, info in self.topo.edges.data():
+            flows = [(sfc.accepted_configuration.edges, sfc.throughput) for sfc in accepted_sfc_list]
+            for eid, (start, end) in enumerate(topo.edge_ends):
                 consumption = 0
-                edge = (start, end)
-                for sfc in accepted_sfc_list:
-                    if edge in sfc.accepted_configuration.edges:
-                        consumption += sfc.accepted_configuration.edges[edge] * \
-                                       sfc.throughput
-                print(edge, "{:.2f}/{}".format(consumption, self.topo.edges.get(edge)['bandwidth']),
-                      "{:.2f}%".format(consumption / self.topo.edges.get(edge)['bandwidth'] * 100))
+                for edges, throughput in flows:
+                    consumption += edges.get(eid, 0) * throughput
+                print((topo.names[start], topo.names[end]), "{:.2f}/{}".format(consumption, topo.bandwidth[eid]),
+                      "{:.2f}%".format(consumption / topo.bandwidth[eid] * 100))
 
     def compute_resource_utilization(self):
         accepted_sfc_list = self.get_accepted_sfc_list()
         usage = sum(sfc.computing_resources_sum for sfc in accepted_sfc_list)
-        capacity = sum(self.topo.nodes[node]['computing_resource']
-                       for node in self.topo.nodes)
+        capacity = self.compiled.cpu.sum()
         return usage / capacity
 
     def print_sfc_list_feature(self):
@@ -239,22 +367,68 @@ class Model(BaseObject):
 
     def reduce(self):
         accepted_sfc_list = self.get_accepted_sfc_list()
+        topo = self.compiled
 
-        sub_model = Model(copy.deepcopy(self.topo), [])
+        cpu_usage = numpy.zeros(topo.n)
+        bandwidth_usage = numpy.zeros(topo.m)
+        for sfc in accepted_sfc_list:
+            for node, usage in sfc.accepted_configuration.computing_resource.items():
+                cpu_usage[node] += usage
+            for eid, count in sfc.accepted_configuration.edges.items():
+                bandwidth_usage[eid] += sfc.throughput * count
+
+        sub_model = Model(self.topo, [], topo.fork())
         # computing resource reduction
-        for index, info in sub_model.topo.nodes.data():
-            info['computing_resource'] -= sum(sfc.accepted_configuration.computing_resource[index]
-                                              for sfc in accepted_sfc_list
-                                              if index in sfc.accepted_configuration.computing_resource)
+        sub_model.compiled.cpu -= cpu_usage
         # throughput reduction
-        for start, end, info in sub_model.topo.edges.data():
-            info['bandwidth'] -= sum(sfc.throughput * sfc.accepted_configuration.edges[(start, end)]
-                                     for sfc in accepted_sfc_list
-                                     if (start, end) in sfc.accepted_configuration.edges)
+        sub_model.compiled.bandwidth -= bandwidth_usage
 
         return sub_model
 
 
+class ResourceLedger(BaseObject):
+    """
+    Residual computing resource per node and bandwidth per edge, updated one configuration at a time.
+    The residual capacities are the cpu and bandwidth of self.topo, so it can be searched directly.
+    """
+
+    def __init__(self, topo: CompiledTopology, accepted_sfc_list: List[SFC] = ()):
+        self.topo = topo.fork()
+        for sfc in accepted_sfc_list:
+            self._consume(sfc, sfc.accepted_configuration, 1)
+
+    def __str__(self):
+        return "<ResourceLedger> cpu left: {}\tbandwidth left: {}".format(
+            self.topo.cpu.sum(), self.topo.bandwidth.sum())
+
+    def _consume(self, sfc: SFC, configuration, sign: int):
+        for node, usage in configuration.computing_resource.items():
+            self.topo.cpu[node] -= sign * usage
+        for eid, count in configuration.edges.items():
+            self.topo.bandwidth[eid] -= sign * sfc.throughput * count
+
+    def fits(self, sfc: SFC, configuration) -> bool:
+        if configuration.get_latency() > sfc.latency:
+            return False
+        for node, usage in configuration.computing_resource.items():
+            if usage > self.topo.cpu[node]:
+                return False
+        for eid, count in configuration.edges.items():
+            if sfc.throughput * count > self.topo.bandwidth[eid]:
+                return False
+        return True
+
+    def try_accept(self, sfc: SFC, configuration) -> bool:
+        """Consume the resources of configuration if they are all left."""
+        if not self.fits(sfc, configuration):
+            return False
+        self._consume(sfc, configuration, 1)
+        return True
+
+    def release(self, sfc: SFC, configuration):
+        self._consume(sfc, configuration, -1)
+
+
 # TODO: readable fields and writeable fields should be weighted or sth else.
 def generate_vnf_set(size: int = 30) -> List[VNF]:
     vnf_list = []
@@ -273,6 +447,7 @@ def generate_vnf_set(size: int = 30) -> List[VNF]:
                 write_fields.add(item)
         vnf_list.append(VNF(latency, computing_resource,
                             read_fields, write_fields))
+    VNFCatalog(vnf_list)
     return vnf_list
 
 
@@ -283,47 +458,41 @@ def generate_vnf_set_with_para_prob(size: int = 30, prob: float = .5) -> List[VN
     total_pairs = size * (size - 1) / 2 + size
     para_pairs = int(total_pairs * prob)
 
+    matrix = numpy.full((size, size), -1, dtype=numpy.int8)
     for i in range(size):
-        vnf1 = vnf_list[i]
         for j in range(i, size):
-            vnf2 = vnf_list[j]
             para = -1
             if random.random() < (para_pairs / total_pairs):
                 para = 1
                 para_pairs -= 1
-            vnf1.paraDict[vnf2] = para
-            vnf2.paraDict[vnf1] = para
+            matrix[i, j] = matrix[j, i] = para
             total_pairs -= 1
 
+    VNFCatalog(vnf_list, matrix)
     return vnf_list
 
 
 def update_vnf_set_with_para_prob(vnf_list, prob_inc: float = .2):
     size = len(vnf_list)
+    matrix = vnf_list[0].catalog.matrix
     total_pairs = size * (size - 1) / 2 + size
     para_pairs = int(total_pairs * prob_inc)
+    total_pairs -= numpy.count_nonzero(numpy.triu(matrix >= 0))
 
     for i in range(size):
-        vnf1 = vnf_list[i]
         for j in range(i, size):
-            vnf2 = vnf_list[j]
-            if vnf1.paraDict[vnf2] >= 0:
-                total_pairs -= 1
-
-    for i in range(size):
-        vnf1 = vnf_list[i]
-        for j in range(i, size):
-            vnf2 = vnf_list[j]
             para = -1
-            if vnf1.paraDict[vnf2] >= 0:
+            if matrix[i, j] >= 0:
                 continue
             if random.random() < (para_pairs / total_pairs):
                 para_pairs -= 1
                 para = 1
-            vnf1.paraDict[vnf2] = para
-            vnf2.paraDict[vnf1] = para
+            matrix[i, j] = matrix[j, i] = para
             total_pairs -= 1
 
+    # cached strategies are stale now
+    pa_cache.clear()
+
 
 # random generate 100 service function chains
 # number of vnf: 3~7
@@ -367,103 +536,486 @@ def generate_sfc_list2(topo: nx.Graph, vnf_set: List[VNF], size=100, base_idx=0)
     return ret
 
 
-class Configuration(BaseObject):
-    def __init__(self, sfc: SFC, route, place: {}, route_latency: int, idx: string):
+def _place_list_list(sfc: SFC, route_length: int, place: List[int]) -> List[List[int]]:
+    place_list_list = [[0]]
+    if place:
+        place_list_list.append([place[0]])
+        for i, para in enumerate(sfc.pa.opt_strategy):
+            next_place = place[i + 1]
+            if para == 1:
+                place_list_list[-1].append(next_place)
+            else:
+                place_list_list.append([next_place])
+    place_list_list.append([route_length - 1])
+    return place_list_list
+
+
+def _as_numpy(values: array) -> numpy.ndarray:
+    return numpy.frombuffer(values, dtype=values.typecode) if len(values) else numpy.zeros(0, dtype=values.typecode)
+
+
+def _csr_positions(offsets: array, rows: numpy.ndarray) -> (numpy.ndarray, numpy.ndarray):
+    """Lengths of the CSR rows and the positions of their entries, row after row."""
+    offsets = _as_numpy(offsets)
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    ends = numpy.cumsum(lengths)
+    positions = numpy.repeat(starts - ends + lengths, lengths) + numpy.arange(ends[-1] if len(ends) else 0)
+    return lengths, positions
+
+
+class ConfigurationPool(BaseObject):
+    """
+    Columnar storage of the configurations of one sfc on one topology, a Configuration is a view of one row.
+    Routes are stored once for the consecutive configurations on the same route, so are the edge footprints
+    shared by them. Cpu footprints are CSR rows, LP values a float array.
+    """
+
+    def __init__(self, topo: CompiledTopology, sfc: SFC):
+        self.topo = topo
         self.sfc = sfc
-        self.route = route
-        self.place = place
-        self.route_latency = route_latency
-        self.idx = idx
-        self.name = "{}_{}".format(sfc.idx, idx)
-
-        # computing resource
-        self.computing_resource = {}
-        for i, vnf in enumerate(sfc.vnf_list):
-            pos = route[place[i]]
-            if pos not in self.computing_resource:
-                self.computing_resource[pos] = 0
-            self.computing_resource[pos] += vnf.computing_resource
-
-        # throughput
-        self.edges = {}
-        if config.state == config.Setting.parabox_naive:
-            place_list_list = [[0]]
-            if self.place:
-                place_list_list.append([self.place[0]])
-                for i, para in enumerate(self.sfc.pa.opt_strategy):
-                    next_place = self.place[i + 1]
-                    if para == 1:
-                        place_list_list[-1].append(next_place)
-                    else:
-                        place_list_list.append([next_place])
-            place_list_list.append([len(self.route) - 1])
-
-            for place_list1, place_list2 in pairwise(place_list_list):
-                for sub_route in [self.route[i:j + 1] for i in place_list1 for j in place_list2]:
-                    for n1, n2 in pairwise(sub_route):
-                        self.edges[(n1, n2)] = self.edges.setdefault(
-                            (n1, n2), 0) + 1
-                        self.edges[(n2, n1)] = self.edges.setdefault(
-                            (n2, n1), 0) + 1
-            self.place_list_list = place_list_list
+        self.m = len(sfc.vnf_list)
+
+        # nodes of route r: route_nodes[route_offsets[r]:route_offsets[r + 1]]
+        self.route_offsets = array('q', [0])
+        self.route_nodes = array('i')
+        # edge footprint f: edge_eids and edge_counts[edge_offsets[f]:edge_offsets[f + 1]]
+        self.edge_offsets = array('q', [0])
+        self.edge_eids = array('i')
+        self.edge_counts = array('i')
+
+        # one entry per configuration
+        self.route_of = array('i')
+        self.edges_of = array('i')
+        self.route_latency = array('d')
+        self.places = array('i')
+        self.cpu_offsets = array('q', [0])
+        self.cpu_nodes = array('i')
+        self.cpu_usage = array('q' if isinstance(sfc.computing_resources_sum, int) else 'd')
+        self.idx = []
+        self.values = array('d')
+        # LpVariables of the configurations in a PuLP problem, their varValue takes over self.values
+        self.lp_vars = {}
+
+        self._last_route = None
+        self._last_edges = None
+
+    def __len__(self):
+        return len(self.idx)
+
+    def __str__(self):
+        return "<ConfigurationPool> sfc: {}\tconfigurations: {}\troutes: {}\tedge footprints: {}".format(
+            self.sfc.idx, len(self), len(self.route_offsets) - 1, len(self.edge_offsets) - 1)
+
+    def _add_route(self, route: List[int]):
+        if route != self._last_route:
+            self.route_nodes.extend(route)
+            self.route_offsets.append(len(self.route_nodes))
+            self._last_route = list(route)
+            self._last_edges = None
+
+    def _add_edges(self, edges: dict):
+        if edges is not self._last_edges:
+            self.edge_eids.extend(edges.keys())
+            self.edge_counts.extend(edges.values())
+            self.edge_offsets.append(len(self.edge_eids))
+            self._last_edges = edges
+
+    def _add_row(self, place: List[int], route_latency: float, idx, computing_resource: dict) -> int:
+        self.route_of.append(len(self.route_offsets) - 2)
+        self.edges_of.append(len(self.edge_offsets) - 2)
+        self.route_latency.append(route_latency)
+        self.places.extend(place)
+        self.cpu_nodes.extend(computing_resource.keys())
+        self.cpu_usage.extend(computing_resource.values())
+        self.cpu_offsets.append(len(self.cpu_nodes))
+        self.idx.append(idx)
+        self.values.append(math.nan)
+        return len(self.idx) - 1
+
+    def append(self, route: List[int], place: List[int], route_latency: float, idx, footprint: tuple = None) -> int:
+        """Add one configuration, footprint is (computing_resource, edges) when they are already built."""
+        self._add_route(route)
+        if footprint is not None:
+            computing_resource, edges = footprint
         else:
-            for n1, n2 in pairwise(route):
-                self.edges[(n1, n2)] = self.edges.setdefault(
-                    (n1, n2), 0) + 1
-                self.edges[(n2, n1)] = self.edges.setdefault(
-                    (n2, n1), 0) + 1
+            computing_resource = {}
+            for i, vnf in enumerate(self.sfc.vnf_list):
+                node = route[place[i]]
+                computing_resource[node] = computing_resource.get(node, 0) + vnf.computing_resource
+
+            if config.state == config.Setting.parabox_naive:
+                edges = {}
+                for place_list1, place_list2 in pairwise(_place_list_list(self.sfc, len(route), place)):
+                    for sub_route in [route[i:j + 1] for i in place_list1 for j in place_list2]:
+                        for eid in self.topo.route_edges(sub_route):
+                            edges[eid] = edges.get(eid, 0) + 1
+            elif self._last_edges is not None:
+                # same route as the last configuration
+                edges = self._last_edges
+            else:
+                edges = {}
+                for eid in self.topo.route_edges(route):
+                    edges[eid] = edges.get(eid, 0) + 1
+        self._add_edges(edges)
+        return self._add_row(place, route_latency, idx, computing_resource)
+
+    def extend(self, route: List[int], places: List[List[int]], route_latency: float, idx_list: list) -> range:
+        """Add the configurations of sfc on one route out of parabox_naive, one per place of places."""
+        self._add_route(route)
+        if self._last_edges is None:
+            edges = {}
+            for eid in self.topo.route_edges(route):
+                edges[eid] = edges.get(eid, 0) + 1
+            self._add_edges(edges)
+
+        vnf_cpu = [vnf.computing_resource for vnf in self.sfc.vnf_list]
+        for place in places:
+            computing_resource = {}
+            for position, cpu in zip(place, vnf_cpu):
+                node = route[position]
+                computing_resource[node] = computing_resource.get(node, 0) + cpu
+            self.cpu_nodes.extend(computing_resource.keys())
+            self.cpu_usage.extend(computing_resource.values())
+            self.cpu_offsets.append(len(self.cpu_nodes))
+            self.places.extend(place)
+
+        first = len(self.idx)
+        self.route_of.extend([len(self.route_offsets) - 2] * len(places))
+        self.edges_of.extend([len(self.edge_offsets) - 2] * len(places))
+        self.route_latency.extend([route_latency] * len(places))
+        self.idx.extend(idx_list)
+        self.values.extend([math.nan] * len(places))
+        return range(first, len(self.idx))
+
+    def footprints(self, rows: numpy.ndarray) -> tuple:
+        """
+        Footprints of the configurations rows in CSR form, for the LP.
+        Returns (cpu_lengths, cpu_nodes, cpu_usage, edge_lengths, edge_eids, edge_counts).
+        """
+        cpu_lengths, positions = _csr_positions(self.cpu_offsets, rows)
+        cpu_nodes = _as_numpy(self.cpu_nodes)[positions]
+        cpu_usage = _as_numpy(self.cpu_usage)[positions]
+        edge_lengths, positions = _csr_positions(self.edge_offsets, _as_numpy(self.edges_of)[rows])
+        edge_eids = _as_numpy(self.edge_eids)[positions]
+        edge_counts = _as_numpy(self.edge_counts)[positions]
+        return cpu_lengths, cpu_nodes, cpu_usage, edge_lengths, edge_eids, edge_counts
+
+
+def configuration_pool(topo: CompiledTopology, sfc: SFC) -> ConfigurationPool:
+    """The pool of sfc on topo, a new one when sfc has none on topo yet."""
+    pool = sfc.__dict__.get('pool')
+    if pool is None or pool.topo is not topo:
+        pool = sfc.pool = ConfigurationPool(topo, sfc)
+    return pool
+
+
+class Configuration(BaseObject):
+    """
+    One configuration of sfc: a route, the route position of each vnf and its resource footprint.
+    It is a view of one row of sfc.pool, the configuration pool of sfc on topo.
+    """
+    __slots__ = ('pool', 'row')
+
+    def __init__(self, topo: CompiledTopology, sfc: SFC, route: List[int], place: {}, route_latency: int,
+                 idx: string, footprint: tuple = None):
+        """footprint: (computing_resource, edges) when they are already built, see route_configurations"""
+        self.pool = pool = configuration_pool(topo, sfc)
+        self.row = pool.append(route, place, route_latency, idx, footprint)
+
+    @classmethod
+    def view(cls, pool: ConfigurationPool, row: int):
+        configuration = cls.__new__(cls)
+        configuration.pool = pool
+        configuration.row = row
+        return configuration
+
+    @property
+    def topo(self) -> CompiledTopology:
+        return self.pool.topo
+
+    @property
+    def sfc(self) -> SFC:
+        return self.pool.sfc
+
+    @property
+    def route(self) -> List[int]:
+        pool = self.pool
+        route = pool.route_of[self.row]
+        return pool.route_nodes[pool.route_offsets[route]:pool.route_offsets[route + 1]].tolist()
+
+    @property
+    def place(self) -> List[int]:
+        m = self.pool.m
+        return self.pool.places[self.row * m:(self.row + 1) * m].tolist()
+
+    @property
+    def route_latency(self) -> float:
+        return self.pool.route_latency[self.row]
+
+    @property
+    def idx(self):
+        return self.pool.idx[self.row]
+
+    @idx.setter
+    def idx(self, idx):
+        self.pool.idx[self.row] = idx
+
+    @property
+    def name(self) -> str:
+        return "{}_{}".format(self.pool.sfc.idx, self.pool.idx[self.row])
+
+    @property
+    def computing_resource(self) -> dict:
+        """node id -> usage"""
+        pool = self.pool
+        start, end = pool.cpu_offsets[self.row], pool.cpu_offsets[self.row + 1]
+        return dict(zip(pool.cpu_nodes[start:end], pool.cpu_usage[start:end]))
+
+    @property
+    def edges(self) -> dict:
+        """edge id -> number of times the flow goes through it"""
+        pool = self.pool
+        footprint = pool.edges_of[self.row]
+        start, end = pool.edge_offsets[footprint], pool.edge_offsets[footprint + 1]
+        return dict(zip(pool.edge_eids[start:end], pool.edge_counts[start:end]))
+
+    @property
+    def var(self):
+        """The LpVariable of the configuration, the configuration itself out of PuLP"""
+        return self.pool.lp_vars.get(self.row, self)
+
+    @var.setter
+    def var(self, var):
+        self.pool.lp_vars[self.row] = var
+
+    @property
+    def varValue(self) -> float:
+        var = self.pool.lp_vars.get(self.row)
+        if var is not None:
+            return var.varValue
+        value = self.pool.values[self.row]
+        return None if math.isnan(value) else value
+
+    @varValue.setter
+    def varValue(self, value: float):
+        self.pool.lp_vars.pop(self.row, None)
+        self.pool.values[self.row] = math.nan if value is None else value
+
+    @property
+    def place_list_list(self) -> List[List[int]]:
+        """parabox_naive: route positions of s, of each group of parallel vnfs and of d"""
+        pool = self.pool
+        route = pool.route_of[self.row]
+        return _place_list_list(pool.sfc, pool.route_offsets[route + 1] - pool.route_offsets[route], self.place)
 
     def __str__(self):
+        names = self.topo.names
+        computing_resource = {names[node]: usage for node, usage in self.computing_resource.items()}
+        edges = {}
+        for eid, count in self.edges.items():
+            start, end = self.topo.edge_ends[eid]
+            edges[(names[start], names[end])] = edges[(names[end], names[start])] = count
         return "route: {}\nplace: {}\ncomputing_resource: {}\nopt_strategy: {}\nedges: {}".format(
-            self.route, self.place.__str__(), self.computing_resource.__str__(), self.sfc.pa.opt_strategy, self.edges)
+            self.topo.route_names(self.route), self.place.__str__(), computing_resource.__str__(),
+            self.sfc.pa.opt_strategy, edges)
 
     # latency (normal & para)
     def get_latency(self) -> float:
-        if config.state == config.Setting.flexchain:
-            return self.route_latency + self.para_analyze()
-        elif config.state == config.Setting.parabox_naive:
-            return self.route_latency + self.sfc.pa.opt_latency
-        elif config.state == config.Setting.nfp_naive:
-            return self.route_latency + self.sfc.pa.opt_latency
-        elif config.state == config.Setting.no_para:
-            return self.route_latency + self.sfc.latency_sum
+        return placement_latency(self.sfc, self.place, self.route_latency)
 
     # get the max resource usage ratio
-    def computing_resource_ratio(self, topo: nx.Graph) -> float:
+    def computing_resource_ratio(self, topo: CompiledTopology) -> float:
         ret = 0
-        for pos in self.computing_resource:
-            ret = max(
-                self.computing_resource[pos] / topo.nodes.data()[pos]['computing_resource'], ret)
+        for pos, usage in self.computing_resource.items():
+            ret = max(usage / topo.cpu[pos], ret)
         return ret
 
     def para_analyze(self):
         """
         Get the optimal parallel execution situation
         """
-        vnf_list_list = [[self.sfc.vnf_list[0]]]
-        for i in range(len(self.place) - 1):
-            next_vnf = self.sfc.vnf_list[i + 1]
-            if self.place[i] == self.place[i + 1]:
-                vnf_list_list[-1].append(next_vnf)
-            else:
-                vnf_list_list.append([next_vnf])
-
-        opt_latency = 0
-        for vnf_list in vnf_list_list:
-            pa = ParaAnalyzer(vnf_list)
-            opt_latency += pa.opt_latency
-
-        return opt_latency
+        return _para_latency(self.sfc.vnf_list, self.place)
+
+
+def placement_latency(sfc: SFC, place: List[int], route_latency: float) -> float:
+    """Configuration.get_latency of sfc placed at place on a route of route_latency, without a configuration"""
+    if config.state == config.Setting.flexchain:
+        return route_latency + _para_latency(sfc.vnf_list, place)
+    elif config.state == config.Setting.parabox_naive:
+        return route_latency + sfc.pa.opt_latency
+    elif config.state == config.Setting.nfp_naive:
+        return route_latency + sfc.pa.opt_latency
+    elif config.state == config.Setting.no_para:
+        return route_latency + sfc.latency_sum
+
+
+def _para_latency(vnf_list: List[VNF], place: List[int]) -> float:
+    """Optimal latency of vnf_list, the vnfs at the same route position run in parallel"""
+    vnf_list_list = [[vnf_list[0]]]
+    for i in range(len(place) - 1):
+        next_vnf = vnf_list[i + 1]
+        if place[i] == place[i + 1]:
+            vnf_list_list[-1].append(next_vnf)
+        else:
+            vnf_list_list.append([next_vnf])
+
+    opt_latency = 0
+    for vnf_list in vnf_list_list:
+        pa = pa_cache.get(vnf_list)
+        opt_latency += pa.opt_latency
+
+    return opt_latency
+
+
+def _first_appearance(items) -> (list, numpy.ndarray):
+    """Distinct items in order of first appearance and the index of each item among them."""
+    index = {}
+    of_item = [index.setdefault(item, len(index)) for item in items]
+    return list(index), numpy.array(of_item, dtype=int)
+
+
+def route_footprints(topo: CompiledTopology, sfc: SFC, route: List[int], places) -> tuple:
+    """
+    Footprints of many configurations of sfc sharing one route, places[c][i] is the route position of vnf i.
+    Returns (nodes, usage, hosted, eids, counts): configuration c uses usage[c][k] cpu on nodes[k]
+    (hosted[c][k] if it places a vnf there) and goes counts[c][e] times through the edge eids[e].
+    nodes and eids are in route order.
+
+    The flow of parabox_naive goes from each position of a group to each position of the next group,
+    so the number of flows over each route position comes from a prefix sum of +/- the group sizes.
+    """
+    m = len(sfc.vnf_list)
+    places = numpy.asarray(places, dtype=int).reshape(-1, m)
+    rows = numpy.arange(len(places))
+    nodes, node_of_pos = _first_appearance(route)
+    eids, eid_of_pos = _first_appearance(topo.route_edges(route))
+
+    usage = numpy.zeros((len(places), len(nodes)), dtype=type(sfc.computing_resources_sum))
+    hosted = numpy.zeros((len(places), len(nodes)), dtype=bool)
+    placed_nodes = node_of_pos[places]
+    for i, vnf in enumerate(sfc.vnf_list):
+        usage[rows, placed_nodes[:, i]] += vnf.computing_resource
+    hosted[rows[:, None], placed_nodes] = True
+
+    if config.state == config.Setting.parabox_naive:
+        # groups: s, the groups of parallel vnfs, d
+        group_of_column = [0, 1]
+        for para in sfc.pa.opt_strategy:
+            group_of_column.append(group_of_column[-1] + (para != 1))
+        if not m:
+            group_of_column.pop()
+        group_of_column.append(group_of_column[-1] + 1)
+        sizes = numpy.bincount(group_of_column)
+        columns = numpy.hstack((numpy.zeros((len(places), 1), dtype=int), places,
+                                numpy.full((len(places), 1), len(route) - 1)))
+
+        diff = numpy.zeros((len(places), len(route)), dtype=int)
+        for column, group in enumerate(group_of_column):
+            # opens a flow to each position of the next group, closes one from each position of the previous group
+            weight = (sizes[group + 1] if group + 1 < len(sizes) else 0) - (sizes[group - 1] if group else 0)
+            numpy.add.at(diff, (rows, columns[:, column]), weight)
+        position_counts = numpy.cumsum(diff, axis=1)[:, :-1]
+    else:
+        position_counts = numpy.ones((len(places), len(route) - 1), dtype=int)
+
+    if len(eids) == len(eid_of_pos):
+        # no edge is used twice by the route
+        return nodes, usage, hosted, eids, position_counts
+    counts = numpy.zeros((len(eids), len(places)), dtype=int)
+    numpy.add.at(counts, eid_of_pos, position_counts.T)
+    return nodes, usage, hosted, eids, counts.T
+
+
+def route_configurations(topo: CompiledTopology, sfc: SFC, route: List[int], places: List[List[int]],
+                         route_latency: float, idx_list: list) -> list:
+    """
+    Configurations of sfc on one route, one per place of places, added to the pool of sfc.
+    Out of parabox_naive the pool stores the route and its edges once for all of them.
+    In parabox_naive the footprints are built at once by route_footprints.
+    """
+    if not places:
+        return []
+
+    pool = configuration_pool(topo, sfc)
+    if config.state != config.Setting.parabox_naive:
+        return [Configuration.view(pool, row) for row in pool.extend(route, places, route_latency, idx_list)]
+
+    nodes, usage, hosted, eids, counts = route_footprints(topo, sfc, route, places)
+    rows = []
+    for place, idx, usage_row, hosted_row, counts_row in zip(places, idx_list, usage.tolist(), hosted.tolist(),
+                                                             counts.tolist()):
+        computing_resource = {node: cpu for node, cpu, placed in zip(nodes, usage_row, hosted_row) if placed}
+        edges = {eid: count for eid, count in zip(eids, counts_row) if count}
+        rows.append(pool.append(route, place, route_latency, idx, (computing_resource, edges)))
+    return [Configuration.view(pool, row) for row in rows]
+
+
+# prefix latencies within this distance of the optimum may still tie with it after float rounding
+_PA_TOLERANCE = 1e-9
 
 
 class ParaAnalyzer:
-    def __init__(self, vnf_list):
+    def __init__(self, vnf_list, dp: bool = None):
         self.opt_latency = sum(vnf.latency for vnf in vnf_list)
         self.opt_vnf_list = vnf_list
         self.opt_strategy = [0 for i in range(len(vnf_list) - 1)]
 
+        if dp is None:
+            dp = config.PA_DP
+
         if len(vnf_list) > 0:
-            self._strategy_dfs(0, vnf_list[:], [])
+            if dp:
+                self._strategy_dp(vnf_list)
+            else:
+                self._strategy_dfs(0, vnf_list[:], [])
+
+    def _strategy_dp(self, vnf_list):
+        """
+        SUMMARY:
+            same result as _strategy_dfs with O(n^2) merges. A strategy cuts vnf_list into contiguous
+            merge groups, states[j] maps the latency of vnf_list[:j] (cut before vnf_list[j]) to its strategy.
+        NOTE:
+            group vnf_list[i:j+1] is valid iff vnf_list[i:j] merged can run in parallel with vnf_list[j],
+            which is the check of branch 1 in _strategy_dfs.
+            latencies are summed in the same order as the dfs, and near-optimal prefixes are kept since float
+            rounding may still tie them at the end. Ties are broken by the greater strategy (dfs tries branch 1 first).
+        """
+        n = len(vnf_list)
+        states = [{0: []}] + [{} for i in range(n)]
+
+        for i in range(n):
+            best = min(states[i])
+            prefixes = [(latency, strategy) for latency, strategy in states[i].items()
+                        if latency <= best + _PA_TOLERANCE]
+            merged = vnf_list[i]
+            j = i + 1
+            while True:
+                # group vnf_list[i:j]
+                suffix = [1] * (j - i - 1)
+                if j < n:
+                    suffix.append(0)
+                for latency, strategy in prefixes:
+                    new_latency = latency + merged.latency
+                    new_strategy = strategy + suffix
+                    if new_latency not in states[j] or new_strategy > states[j][new_latency]:
+                        states[j][new_latency] = new_strategy
+
+                if j >= n or merged.can_run_in_parallel(vnf_list[j]) < 0:
+                    break
+                merged = merged.para_merge(vnf_list[j])
+                j += 1
+
+        opt_latency = min(states[n])
+        if opt_latency < self.opt_latency:
+            opt_strategy = states[n][opt_latency]
+            opt_vnf_list = [vnf_list[0]]
+            for vnf, para in zip(vnf_list[1:], opt_strategy):
+                if para == 1:
+                    opt_vnf_list[-1] = opt_vnf_list[-1].para_merge(vnf)
+                else:
+                    opt_vnf_list.append(vnf)
+            self.opt_latency, self.opt_strategy, self.opt_vnf_list = opt_latency, opt_strategy, opt_vnf_list
 
     def _strategy_dfs(self, index, vnf_list, strategy):
         """
@@ -499,6 +1051,49 @@ class ParaAnalyzer:
         return "{} {}".format(self.opt_strategy, self.opt_latency)
 
 
+class ParaAnalyzerCache(BaseObject):
+    """
+    LRU cache of ParaAnalyzer shared by the whole process, keyed on the identity of the vnfs in the segment.
+    Must be cleared when the parallelism between vnfs changes.
+    """
+
+    def __init__(self, size: int = None):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __str__(self):
+        total = self.hits + self.misses
+        return "hits: {}\tmisses: {}\thit rate: {:.2f}%\tsize: {}".format(
+            self.hits, self.misses, self.hits / total * 100 if total else 0, len(self._cache))
+
+    def get(self, vnf_list) -> ParaAnalyzer:
+        key = tuple(vnf_list)
+        pa = self._cache.get(key)
+        if pa is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return pa
+
+        self.misses += 1
+        pa = ParaAnalyzer(list(key))
+        self._cache[key] = pa
+        size = self.size if self.size is not None else config.PA_CACHE_SIZE
+        while len(self._cache) > size:
+            self._cache.popitem(last=False)
+        return pa
+
+    def clear(self):
+        self._cache.clear()
+
+    def reset_counters(self):
+        self.hits = self.misses = 0
+
+
+pa_cache = ParaAnalyzerCache()
+
+
 def _dijkstra(topo: nx.Graph, s) -> {}:
     ret = {}
     heap = [(0, s)]
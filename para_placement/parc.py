@@ -0,0 +1,469 @@
+# greedy placement engine of PARC and greedy_dc: generate_configuration_greedy_dfs over indexed residual state
+
+import bisect
+import math
+import time
+
+import scipy.sparse
+from scipy.sparse.csgraph import breadth_first_order
+
+from para_placement.cg import _tp_parabox
+from para_placement.model import *
+from para_placement.presolve import _LATENCY_TOLERANCE, _processing_latency
+from para_placement.routing import router
+
+
+class ParcEngine(BaseObject):
+    """
+    The greedy dfs of generate_configuration_greedy_dfs and the acceptance of ResourceLedger on residual
+    capacities of its own, with the same results:
+    - cpu and bandwidth are python lists, updated by the same operations in the same order
+    - the servers of a step are the first ones of a ServerIndex
+    - the searches of _bfs_route_general are kept for each source, see route
+    self.topo is only used to build the configurations, its capacities are not read nor written.
+    """
+
+    def __init__(self, topo: CompiledTopology, search: str = None):
+        self.topo = topo
+        # config.GREEDY_SEARCH if None, see placements
+        self.search = search
+        self.cpu = topo.cpu.tolist()
+        self.bandwidth = topo.bandwidth.tolist()
+        self.latency = topo.latency.tolist()
+        self._cpu_capacity = getattr(topo, 'base', topo).cpu.tolist()
+        self._bandwidth_capacity = getattr(topo, 'base', topo).bandwidth.tolist()
+        # row, node and edge of each entry of the csr adjacency of topo
+        self._entry_row = numpy.repeat(numpy.arange(topo.n), numpy.diff(topo.indptr))
+        self._entry_node = topo.indices
+        self._entry_edge = topo.adj_edges
+
+        self._index = ServerIndex()
+        self._index.sync(topo)
+        # number of configurations being built holding bandwidth of each edge,
+        # and the bandwidth of the held edges before they were first held
+        self._held = [0] * topo.m
+        self._committed = {}
+        # ids of the holds in place, 0 for none
+        self._holds = [0]
+        self._hold_count = 0
+        # number of configurations accepted, the routes of a tree of this version are only blocked by held bandwidth
+        self._version = 0
+        # s -> _RouteTree, on the bandwidths before the holds and on the held ones
+        self._trees = {}
+        self._held_trees = {}
+        # (before, after, raise number) of the releases leaving an edge with more bandwidth than before its hold,
+        # in increasing order, the floats of before - tp + tp may be above before
+        self._raises = []
+        self._raise_width = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return "<ParcEngine> route hits: {}\tmisses: {}\ttrees: {}".format(self.hits, self.misses, len(self._trees))
+
+    def _set_cpu(self, node: int, cpu: float):
+        self._index.set(node, cpu)
+        self.cpu[node] = cpu
+
+    def _hold(self, edges: List[int], tp):
+        self._hold_count += 1
+        self._holds.append(self._hold_count)
+        for eid in edges:
+            if not self._held[eid]:
+                self._committed[eid] = self.bandwidth[eid]
+            self._held[eid] += 1
+            self.bandwidth[eid] -= tp
+
+    def _release(self, edges: List[int], tp, bandwidth: List[float]):
+        """Give back the bandwidth held on edges, which had bandwidth before they were held."""
+        self._holds.pop()
+        for eid, before in zip(edges, bandwidth):
+            self.bandwidth[eid] += tp
+            self._held[eid] -= 1
+            if not self._held[eid]:
+                del self._committed[eid]
+            if self.bandwidth[eid] > before:
+                bisect.insort(self._raises, (before, self.bandwidth[eid], len(self._raises)))
+                self._raise_width = max(self._raise_width, self.bandwidth[eid] - before)
+
+    def _raised(self, tp, since: int) -> bool:
+        """Whether a release after the first since ones left an edge with more bandwidth than tp, from at most tp"""
+        raises = self._raises
+        i = bisect.bisect_right(raises, (tp, math.inf, math.inf))
+        while i > 0 and raises[i - 1][0] >= tp - self._raise_width:
+            i -= 1
+            before, after, number = raises[i]
+            if after > tp and number >= since:
+                return True
+        return False
+
+    def _tree(self, s: int, tp, held: bool) -> '_RouteTree':
+        """
+        The whole search of _bfs_route_general from s, on the current bandwidths if held else on the ones before
+        the holds. breadth_first_order scans the rows of the csr in order, the order of topo.adj.
+        """
+        values = numpy.array(self.bandwidth)
+        if not held and self._committed:
+            values[list(self._committed)] = list(self._committed.values())
+        value = values[self._entry_edge]
+        usable = value > tp
+        indptr = numpy.zeros(self.topo.n + 1, dtype=int)
+        numpy.cumsum(numpy.bincount(self._entry_row[usable], minlength=self.topo.n), out=indptr[1:])
+        graph = scipy.sparse.csr_matrix((numpy.ones(indptr[-1]), self._entry_node[usable], indptr),
+                                        shape=(self.topo.n, self.topo.n))
+        order, parent = breadth_first_order(graph, s, directed=True, return_predecessors=True)
+        parent[s] = s
+
+        # an edge (u, v) is left out if u is reached but v is not, or v is reached from a node after u
+        position = numpy.full(self.topo.n, -1)
+        position[order] = numpy.arange(len(order))
+        reached = position >= 0
+        parent_position = numpy.where(reached, position[numpy.maximum(parent, 0)], -1)
+        row_position = position[self._entry_row]
+        node = self._entry_node
+        left = (row_position >= 0) & ~usable & (~reached[node] | (parent_position[node] > row_position))
+        unreached = left & ~reached[node]
+        tree = _RouteTree(tp, self._version, len(self._raises), self._holds[-1] if held else None)
+        tree.parent = numpy.where(reached, parent, -1).tolist()
+        tree.low = value[left].max() if left.any() else -math.inf
+        tree.bound = value[unreached].max() if unreached.any() else -math.inf
+        return tree
+
+    def _valid(self, tree: '_RouteTree', d: int, tp) -> bool:
+        """Whether the route of tree to d is still the first one for tp, or d still not reached, see route"""
+        if tree is None or self._raised(tp, tree.raises):
+            return False
+        if tree.hold is not None and tree.hold not in self._holds:
+            return False
+        return tp >= tree.low or (tree.parent[d] < 0 and tp >= tree.bound)
+
+    def route(self, s: int, d: int, tp) -> (List[int], float, List[int]):
+        """
+        _bfs_route_general(topo, s, d, tp) and the edges of its route.
+
+        The search returns the first route in a fixed order (hops, then the positions in the adjacency)
+        among the routes on edges with more bandwidth than tp. A search from s for tp0 runs the same for any tp
+        at least the bandwidth of the edges it left out, and the bandwidths only decrease: its route to d is still
+        the first one for such a tp as long as all its edges have more than tp, the routes left are a subset of
+        the ones it was the first of. If d was not reached, it still is not for any tp at least the bandwidth of
+        the edges out of the nodes reached.
+        The searches from each s are kept as a _RouteTree, made on the bandwidths before the holds and made again
+        when one of its routes is blocked by the configurations accepted since, or when a release raised a
+        bandwidth over tp since. The routes blocked by held bandwidth are searched on the current bandwidths,
+        kept as long as the holds they were made under.
+        For config.ROUTING 'latency', the routes are searched by routing.router on the bandwidths of self.
+        """
+        if s == d:
+            return [s], 0, []
+        if config.ROUTING == 'latency':
+            router.sync(self.topo)
+            return router.route(self.bandwidth, s, d, tp)
+        tree = self._trees.get(s)
+        if self._valid(tree, d, tp):
+            self.hits += 1
+        else:
+            self.misses += 1
+            tree = self._trees[s] = self._tree(s, tp, False)
+        result = tree.route(d, tp, self)
+        if result is None and (tree.version != self._version or tp > tree.tp):
+            self.misses += 1
+            tree = self._trees[s] = self._tree(s, tp, False)
+            result = tree.route(d, tp, self)
+        if result is not None:
+            return result
+
+        tree = self._held_trees.get(s)
+        if not self._valid(tree, d, tp) or tree.version != self._version:
+            tree = self._held_trees[s] = self._tree(s, tp, True)
+        result = tree.route(d, tp, self)
+        if result is None:
+            tree = self._held_trees[s] = self._tree(s, tp, True)
+            result = tree.route(d, tp, self)
+        return result
+
+    def greedy_dfs(self, sfc: SFC, deep: int = 10) -> Configuration:
+        """generate_configuration_greedy_dfs(topo, sfc, deep=deep) on the residual capacities of self"""
+        origin_sfc = None
+        if config.state == config.Setting.parabox_naive:
+            origin_sfc = sfc
+            tp = origin_sfc.throughput * _tp_parabox(-1, origin_sfc.pa.opt_strategy[:])
+            sfc = SFC(origin_sfc.vnf_list[:], sfc.latency, tp, sfc.s, sfc.d, sfc.idx)
+
+        result = self._dfs(sfc.vnf_list, sfc.throughput, self.topo.index[sfc.s], self.topo.index[sfc.d], origin_sfc,
+                           deep)
+        if result is None:
+            return None
+        route, place, route_latency = result
+        return Configuration(self.topo, sfc, route, place, route_latency, 0)
+
+    def _dfs(self, vnf_list: List[VNF], tp, s: int, d: int, origin_sfc: SFC, deep: int) -> tuple:
+        """(route, place, route latency) of vnf_list from s to d, None if not found"""
+        if not vnf_list:
+            route, route_latency, _ = self.route(s, d, tp)
+            return route, [], route_latency
+
+        requirement = vnf_list[0].computing_resource
+        if config.state == config.Setting.nfp_naive:
+            requirement = sum(vnf.computing_resource for vnf in vnf_list)
+
+        for server in self._index.top(requirement, deep):
+            route, route_latency, edges = self.route(s, server, tp)
+            if not route:
+                continue
+
+            # hold the resources of the vnfs placed on server and of the route
+            placed = 0
+            k = 0
+            while k < len(vnf_list) and vnf_list[k].computing_resource <= self.cpu[server]:
+                placed += vnf_list[k].computing_resource
+                self._set_cpu(server, self.cpu[server] - vnf_list[k].computing_resource)
+                k += 1
+            bandwidth = [self.bandwidth[eid] for eid in edges]
+            self._hold(edges, tp)
+
+            sub_tp = tp
+            if config.state == config.Setting.parabox_naive:
+                s_id = origin_sfc.vnf_list.index(vnf_list[0])
+                sub_tp = origin_sfc.throughput * _tp_parabox(s_id + k - 1, origin_sfc.pa.opt_strategy[:])
+            sub = self._dfs(vnf_list[k:], sub_tp, server, d, origin_sfc, max(deep // 2, 1))
+
+            self._release(edges, tp, bandwidth)
+            self._set_cpu(server, self.cpu[server] + placed)
+
+            if sub is not None:
+                sub_route, sub_place, sub_latency = sub
+                offset = len(route) - 1
+                place = [offset] * k + [sub_place + offset for sub_place in sub_place]
+                return route + sub_route[1:], place, route_latency + sub_latency
+
+        return None
+
+    def placements(self, sfc: SFC):
+        """
+        Yield the configurations of sfc to try in turn: the one of beam_search if self.search
+        (config.GREEDY_SEARCH if None) is 'beam' and it found one, then the one of greedy_dfs, if found.
+        The greedy dfs only runs when the configuration of the beam search is missing or not accepted.
+        """
+        if (self.search or config.GREEDY_SEARCH) == 'beam':
+            configuration = self.beam_search(sfc)
+            if configuration is not None:
+                yield configuration
+        configuration = self.greedy_dfs(sfc)
+        if configuration is not None:
+            yield configuration
+
+    def place(self, sfc: SFC) -> Configuration:
+        """The first configuration of placements(sfc), None if none"""
+        return next(self.placements(sfc), None)
+
+    def beam_search(self, sfc: SFC, width: int = None) -> Configuration:
+        """
+        Beam search over the placements of greedy_dfs: a state is a route from s to a server with the first k vnfs
+        placed along it, as many as fit on each server in order. The states of each k are expanded in turn, the width
+        best ones by latency left and by headroom (least fraction of a resource left where the state uses it), to the
+        servers with the cpu of the next vnf whose shortest path latencies through them to d are within the latency
+        left, by decreasing cpu. A state is dropped if another one at the same server with the same k has no more
+        latency and uses no more of each resource.
+        Returns the best complete configuration within sfc.latency, by the same score, None if none is found within
+        config.GREEDY_BEAM_EXPANSIONS route searches and config.GREEDY_BEAM_TIME seconds.
+        Only the best one is made a Configuration, the other complete states add no row to sfc.pool.
+        """
+        width = width or config.GREEDY_BEAM_WIDTH
+        origin_sfc = None
+        tp = sfc.throughput
+        if config.state == config.Setting.parabox_naive:
+            origin_sfc = sfc
+            tp = origin_sfc.throughput * _tp_parabox(-1, origin_sfc.pa.opt_strategy[:])
+            sfc = SFC(origin_sfc.vnf_list[:], sfc.latency, tp, sfc.s, sfc.d, sfc.idx)
+
+        vnf_list = sfc.vnf_list
+        m = len(vnf_list)
+        s = self.topo.index[sfc.s]
+        d = self.topo.index[sfc.d]
+        budget = sfc.latency - _processing_latency(sfc) + _LATENCY_TOLERANCE
+        to_d = self._index.latencies(d)
+        start = time.time()
+        expansions = 0
+
+        # states by number of vnfs placed
+        buckets = [[] for _ in range(m + 1)]
+        buckets[0].append(_BeamState(s, 0, [s], [], 0, [], {}, {}, 1.0))
+        best = None
+        best_score = -math.inf
+        for k in range(m + 1):
+            for state in self._beam(buckets[k], width, sfc.latency):
+                if expansions >= config.GREEDY_BEAM_EXPANSIONS or time.time() - start > config.GREEDY_BEAM_TIME:
+                    return self._configuration(sfc, best)
+                state_tp = tp
+                if origin_sfc is not None and k > 0:
+                    state_tp = origin_sfc.throughput * _tp_parabox(k - 1, origin_sfc.pa.opt_strategy[:])
+
+                holds = self._apply(state)
+                if k == m:
+                    route, route_latency, edges = self.route(state.node, d, state_tp)
+                    expansions += 1
+                    complete = self._expand(state, d, 0, 0, route, route_latency, edges, state_tp) if route else None
+                    self._unapply(state, holds)
+                    if complete is None:
+                        continue
+                    score = self._score(complete, sfc.latency)
+                    if placement_latency(sfc, complete.place, complete.latency) <= sfc.latency and score > best_score:
+                        best = complete
+                        best_score = score
+                    continue
+
+                requirement = vnf_list[k].computing_resource
+                if config.state == config.Setting.nfp_naive:
+                    requirement = sum(vnf.computing_resource for vnf in vnf_list[k:])
+                left = budget - state.latency
+                from_node = self._index.latencies(state.node)
+                servers = [server for server in self._index.within(state.node, left, requirement)
+                           if from_node[server] + to_d[server] <= left][:width]
+                for server in servers:
+                    route, route_latency, edges = self.route(state.node, server, state_tp)
+                    expansions += 1
+                    if not route or route_latency + to_d[server] > left:
+                        continue
+                    placed = 0
+                    j = k
+                    while j < m and placed + vnf_list[j].computing_resource <= self.cpu[server]:
+                        placed += vnf_list[j].computing_resource
+                        j += 1
+                    buckets[j].append(self._expand(state, server, j - k, placed, route, route_latency, edges,
+                                                   state_tp))
+                self._unapply(state, holds)
+        return self._configuration(sfc, best)
+
+    def _configuration(self, sfc: SFC, state: '_BeamState') -> Configuration:
+        if state is None:
+            return None
+        return Configuration(self.topo, sfc, state.route, state.place, state.latency, 0)
+
+    @staticmethod
+    def _score(state: '_BeamState', latency) -> float:
+        """Fraction of latency left plus headroom"""
+        return (latency - state.latency) / latency + state.headroom
+
+    @staticmethod
+    def _beam(states: List['_BeamState'], width: int, latency) -> List['_BeamState']:
+        """The width best states not dominated by a better one"""
+        states.sort(key=lambda state: -ParcEngine._score(state, latency))
+        kept = []
+        for state in states:
+            if len(kept) == width:
+                break
+            if not any(other.dominates(state) for other in kept):
+                kept.append(state)
+        return kept
+
+    def _apply(self, state: '_BeamState') -> List[List[float]]:
+        """Hold the resources of state, returns the bandwidths of its segments before they were held"""
+        for node, usage in state.cpu.items():
+            self._set_cpu(node, self.cpu[node] - usage)
+        holds = []
+        for edges, tp in state.segments:
+            holds.append([self.bandwidth[eid] for eid in edges])
+            self._hold(edges, tp)
+        return holds
+
+    def _unapply(self, state: '_BeamState', holds: List[List[float]]):
+        for (edges, tp), bandwidth in reversed(list(zip(state.segments, holds))):
+            self._release(edges, tp, bandwidth)
+        for node, usage in state.cpu.items():
+            self._set_cpu(node, self.cpu[node] + usage)
+
+    def _expand(self, state: '_BeamState', server: int, count: int, placed, route: List[int], route_latency,
+                edges: List[int], tp) -> '_BeamState':
+        """state with route to server and count more vnfs placed on it, using placed cpu, while state is applied"""
+        cpu = dict(state.cpu)
+        bandwidth = dict(state.bandwidth)
+        headroom = state.headroom
+        if placed:
+            cpu[server] = cpu.get(server, 0) + placed
+            if self._cpu_capacity[server] > 0:
+                headroom = min(headroom, (self.cpu[server] - placed) / self._cpu_capacity[server])
+        for eid in edges:
+            bandwidth[eid] = bandwidth.get(eid, 0) + tp
+            headroom = min(headroom, (self.bandwidth[eid] - tp) / self._bandwidth_capacity[eid])
+        offset = len(state.route) + len(route) - 2
+        return _BeamState(server, state.k + count, state.route + route[1:], state.place + [offset] * count,
+                          state.latency + route_latency, state.segments + [(edges, tp)], cpu, bandwidth, headroom)
+
+    def try_accept(self, sfc: SFC, configuration: Configuration) -> bool:
+        """ResourceLedger.try_accept on the residual capacities of self"""
+        if configuration.get_latency() > sfc.latency:
+            return False
+        computing_resource = configuration.computing_resource
+        edges = configuration.edges
+        for node, usage in computing_resource.items():
+            if usage > self.cpu[node]:
+                return False
+        for eid, count in edges.items():
+            if sfc.throughput * count > self.bandwidth[eid]:
+                return False
+
+        for node, usage in computing_resource.items():
+            self._set_cpu(node, self.cpu[node] - usage)
+        for eid, count in edges.items():
+            self.bandwidth[eid] -= sfc.throughput * count
+        self._version += 1
+        return True
+
+
+class _RouteTree(object):
+    """
+    Search of _bfs_route_general for throughput tp: the parent of each node, -1 if not reached, the source is its own.
+    low is the most bandwidth of an edge left out, bound of an edge from a reached node to one not reached.
+    hold is the hold the search was made under, None if made on the bandwidths before the holds.
+    """
+
+    def __init__(self, tp, version: int, raises: int, hold):
+        self.tp = tp
+        self.version = version
+        self.raises = raises
+        self.hold = hold
+        self.parent = None
+        self.low = -math.inf
+        self.bound = -math.inf
+
+    def route(self, d: int, tp, engine: ParcEngine) -> (List[int], float, List[int]):
+        """The route to d and its edges, [] if d is not reached, None if an edge has no more than tp bandwidth"""
+        if self.parent[d] < 0:
+            return [], 0, []
+        route = [d]
+        node = d
+        while self.parent[node] != node:
+            node = self.parent[node]
+            route.append(node)
+        route.reverse()
+        edges = [engine.topo.edge_index[edge] for edge in zip(route, route[1:])]
+        latency = 0
+        for eid in edges:
+            if engine.bandwidth[eid] <= tp:
+                return None
+            latency += engine.latency[eid]
+        return route, latency, edges
+
+
+class _BeamState(object):
+    """
+    Partial placement of ParcEngine.beam_search: at node with k vnfs placed, the (edges, tp) of its segments,
+    its cpu usage of each node and bandwidth usage of each edge, and the least fraction left of a resource it uses.
+    """
+
+    def __init__(self, node: int, k: int, route: List[int], place: List[int], latency, segments: list, cpu: dict,
+                 bandwidth: dict, headroom):
+        self.node = node
+        self.k = k
+        self.route = route
+        self.place = place
+        self.latency = latency
+        self.segments = segments
+        self.cpu = cpu
+        self.bandwidth = bandwidth
+        self.headroom = headroom
+
+    def dominates(self, state: '_BeamState') -> bool:
+        return self.node == state.node and self.latency <= state.latency and \
+            all(state.cpu.get(node, 0) >= usage for node, usage in self.cpu.items()) and \
+            all(state.bandwidth.get(eid, 0) >= usage for eid, usage in self.bandwidth.items())
@@ -0,0 +1,121 @@
+# presolve of the placement LP: reject the infeasible sfcs before the generation of configurations
+# and shrink the configuration sets before the LP is built
+
+import scipy.sparse
+from scipy.sparse.csgraph import dijkstra
+
+from para_placement.model import *
+
+# latency lower bounds within this distance of sfc.latency may still be met after float rounding
+_LATENCY_TOLERANCE = 1e-9
+
+
+def _latency_from(topo: CompiledTopology, sources: List[int]) -> numpy.ndarray:
+    """Shortest path latency from each node of sources (rows) to every node, inf if unreachable."""
+    graph = scipy.sparse.csr_matrix((topo.latency[topo.adj_edges], topo.indices, topo.indptr),
+                                    shape=(topo.n, topo.n))
+    return dijkstra(graph, indices=sources)
+
+
+def _processing_latency(sfc: SFC) -> float:
+    """Lower bound of the latency of the vnfs of sfc however they are placed, see Configuration.get_latency"""
+    if config.state == config.Setting.no_para:
+        return sfc.latency_sum
+    return sfc.pa.opt_latency
+
+
+def reject_infeasible_sfcs(model: Model) -> List[SFC]:
+    """
+    Find the sfcs of model without any feasible configuration on model.compiled and set sfc.servers,
+    the candidate servers of each sfc, for the generation of configurations.
+
+    A server v is a candidate if it has the cpu of a vnf (of all of them for nfp_naive) and
+    latency(s, v) + latency(v, d) + the least processing latency of the vnfs is within sfc.latency,
+    for the shortest path latencies over the whole topology.
+    An sfc is rejected if the servers of its vnfs cannot be candidates: none left, none with the cpu of its largest
+    vnf, or less cpu on its len(vnf_list) largest candidates than it needs in total.
+    Returns the rejected sfcs, their configurations are cleared and they have no candidate server.
+    """
+    topo = model.compiled
+    endpoints = sorted({topo.index[sfc.s] for sfc in model.sfc_list} | {topo.index[sfc.d] for sfc in model.sfc_list})
+    row_of = {node: row for row, node in enumerate(endpoints)}
+    latency = _latency_from(topo, endpoints) if endpoints else None
+
+    rejected = []
+    for sfc in model.sfc_list:
+        # the topology is undirected: latency(v, d) = latency(d, v)
+        route_latency = latency[row_of[topo.index[sfc.s]]] + latency[row_of[topo.index[sfc.d]]]
+        budget = sfc.latency - _processing_latency(sfc) + _LATENCY_TOLERANCE
+
+        if not sfc.vnf_list:
+            feasible = route_latency[topo.index[sfc.s]] <= budget
+            sfc.servers = []
+        else:
+            usages = [vnf.computing_resource for vnf in sfc.vnf_list]
+            need = sfc.computing_resources_sum if config.state == config.Setting.nfp_naive else min(usages)
+            candidates = numpy.flatnonzero((topo.cpu >= need) & (route_latency <= budget))
+            cpu = numpy.sort(topo.cpu[candidates])[::-1]
+            feasible = len(cpu) > 0 and cpu[0] >= max(usages) and \
+                cpu[:len(usages)].sum() >= sfc.computing_resources_sum
+            sfc.servers = candidates.tolist() if feasible else []
+
+        if not feasible:
+            sfc.configurations = []
+            rejected.append(sfc)
+    return rejected
+
+
+def prune_configurations(sfc: SFC) -> (int, int):
+    """
+    Drop the duplicate and the dominated configurations of sfc, keep the others in order.
+    A configuration is dominated by another one using no more cpu on each node, no more bandwidth on each edge
+    and with no more latency: it can be replaced by the other one in any solution of the LP.
+    Returns the number of duplicate and of dominated configurations dropped.
+    """
+    columns = []
+    seen = set()
+    duplicates = 0
+    for configuration in sfc.configurations:
+        cpu = frozenset(configuration.computing_resource.items())
+        edges = configuration.edges
+        latency = configuration.get_latency()
+        key = (cpu, frozenset(edges.items()), latency)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        columns.append((configuration, cpu, edges, latency))
+
+    # every configuration of sfc uses sfc.computing_resources_sum cpu in total,
+    # so one uses no more cpu than another on each node only if they use the same
+    groups = {}
+    for i, (_, cpu, _, _) in enumerate(columns):
+        groups.setdefault(cpu, []).append(i)
+
+    dominated = set()
+    for group in groups.values():
+        # the configurations dominating one come before it
+        group.sort(key=lambda i: (sum(columns[i][2].values()), columns[i][3]))
+        kept = []
+        for i in group:
+            _, _, edges, latency = columns[i]
+            for j in kept:
+                _, _, other_edges, other_latency = columns[j]
+                if other_latency <= latency and all(edges.get(eid, 0) >= count for eid, count in other_edges.items()):
+                    dominated.add(i)
+                    break
+            else:
+                kept.append(i)
+
+    sfc.configurations = [column[0] for i, column in enumerate(columns) if i not in dominated]
+    return duplicates, len(dominated)
+
+
+def presolve(model: Model) -> (int, int):
+    """prune_configurations for each sfc of model, returns the total numbers of configurations dropped"""
+    duplicates = dominated = 0
+    for sfc in model.sfc_list:
+        sfc_duplicates, sfc_dominated = prune_configurations(sfc)
+        duplicates += sfc_duplicates
+        dominated += sfc_dominated
+    return duplicates, dominated
@@ -0,0 +1,144 @@
+# least latency routing over residual bandwidth: A* with landmark lower bounds
+
+import heapq
+import math
+
+import scipy.sparse
+from scipy.sparse.csgraph import dijkstra
+
+from para_placement.model import *
+
+# max number of destinations whose bounds are kept
+_BOUNDS_CACHE_SIZE = 1024
+
+
+class Router(BaseObject):
+    """
+    Least latency routes over the edges with enough residual bandwidth, see route.
+    The lower bounds of A* are the landmark (ALT) bounds of the latencies on the whole topology:
+    |latency(l, d) - latency(l, v)| <= latency(v, d) for each landmark l, still a lower bound
+    once edges are left out. The landmarks are chosen farthest first, on sync to a new structure.
+    """
+
+    def __init__(self, landmarks: int = None, widest: bool = None):
+        self.landmarks = landmarks
+        self.widest = widest
+        self._structure = None
+        self._from_landmarks = None
+        self._latency = []
+        self._adj = []
+        self._bounds = {}
+        self.searches = 0
+        self.pops = 0
+
+    def __str__(self):
+        return "<Router> landmarks: {}\tsearches: {}\tnodes settled per search: {:.1f}".format(
+            0 if self._from_landmarks is None else len(self._from_landmarks), self.searches,
+            self.pops / self.searches if self.searches else 0)
+
+    def sync(self, topo: CompiledTopology):
+        structure = getattr(topo, 'base', topo)
+        if self._structure is structure:
+            return
+        self._structure = structure
+        self._latency = structure.latency.tolist()
+        self._adj = structure.adj
+        self._bounds.clear()
+        count = min(self.landmarks or config.ROUTING_LANDMARKS, structure.n)
+        if not count:
+            self._from_landmarks = None
+            return
+
+        graph = scipy.sparse.csr_matrix((structure.latency[structure.adj_edges], structure.indices, structure.indptr),
+                                        shape=(structure.n, structure.n))
+        # farthest first, from the node farthest from node 0, within the component of node 0
+        latency = dijkstra(graph, indices=0)
+        latency[numpy.isinf(latency)] = -1
+        landmarks = [int(latency.argmax())]
+        nearest = dijkstra(graph, indices=landmarks[0])
+        while len(landmarks) < count:
+            candidate = numpy.where(numpy.isinf(nearest), -1, nearest)
+            landmark = int(candidate.argmax())
+            if candidate[landmark] <= 0:
+                break
+            landmarks.append(landmark)
+            nearest = numpy.minimum(nearest, dijkstra(graph, indices=landmark))
+        self._from_landmarks = dijkstra(graph, indices=landmarks)
+
+    def _bound(self, d: int) -> List[float]:
+        """Lower bound of the latency from each node to d, inf if d is unreachable from it"""
+        bound = self._bounds.get(d)
+        if bound is None:
+            if self._from_landmarks is None:
+                bound = [0] * self._structure.n
+            else:
+                with numpy.errstate(invalid='ignore'):
+                    gap = numpy.abs(self._from_landmarks[:, [d]] - self._from_landmarks)
+                # nan: neither v nor d reach the landmark
+                bound = numpy.nan_to_num(gap, nan=0, posinf=math.inf).max(axis=0).tolist()
+            if len(self._bounds) >= _BOUNDS_CACHE_SIZE:
+                self._bounds.clear()
+            self._bounds[d] = bound
+        return bound
+
+    def route(self, bandwidth, s: int, d: int, tp, at_least: bool = False, cpu=None) -> (List[int], float, List[int]):
+        """
+        Least latency route from s to d on the edges with more than tp bandwidth (at least tp if at_least),
+        through no node with cpu other than d if cpu is given, its latency and its edges. [], 0, [] if none.
+        Ties are broken by the largest least bandwidth along the route if widest, then by the order of the search.
+        """
+        if s == d:
+            return [s], 0, []
+        widest = config.ROUTING_WIDEST if self.widest is None else self.widest
+        self.searches += 1
+        bound = self._bound(d)
+        latency = self._latency
+        adj = self._adj
+
+        n = self._structure.n
+        parent = [-1] * n
+        parent_edge = [-1] * n
+        best = [None] * n
+        best[s] = 0, -math.inf
+        done = [False] * n
+        count = 0
+        # (latency + bound, -width, count, latency, node)
+        heap = [(bound[s], -math.inf, count, 0, s)]
+        while heap:
+            _, width, _, node_latency, node = heapq.heappop(heap)
+            if done[node]:
+                continue
+            done[node] = True
+            self.pops += 1
+            if node == d:
+                route = [d]
+                edges = []
+                while node != s:
+                    edges.append(parent_edge[node])
+                    node = parent[node]
+                    route.append(node)
+                route.reverse()
+                edges.reverse()
+                return route, node_latency, edges
+            for adj_node, eid in adj[node]:
+                if done[adj_node] or bound[adj_node] == math.inf:
+                    continue
+                if bandwidth[eid] < tp or (bandwidth[eid] == tp and not at_least):
+                    continue
+                if cpu is not None and cpu[adj_node] > 0 and adj_node != d:
+                    continue
+                adj_latency = node_latency + latency[eid]
+                adj_width = max(width, -bandwidth[eid]) if widest else 0
+                other = best[adj_node]
+                if other is not None and other <= (adj_latency, adj_width):
+                    continue
+                best[adj_node] = adj_latency, adj_width
+                parent[adj_node] = node
+                parent_edge[adj_node] = eid
+                count += 1
+                heapq.heappush(heap, (adj_latency + bound[adj_node], adj_width, count, adj_latency, adj_node))
+        return [], 0, []
+
+
+# shared by the searches of cg and ParcEngine, see Router.sync
+router = Router()
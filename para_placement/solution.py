@@ -1,34 +1,151 @@
+import multiprocessing
+import os
+
 from progress.bar import PixelBar
 from pulp import value, LpMaximize, LpContinuous, LpVariable, LpProblem, lpSum
 from ttictoc import Timer
 
-from para_placement.cg import generate_configurations, generate_configuration_greedy_dfs
+from para_placement.cg import generate_configurations, generate_configurations_parallel, column_generation, \
+    route_cache
 from para_placement.evaluation import *
+from para_placement.lp import PlacementLP, IncrementalPlacementLP
 from para_placement.model import *
+from para_placement.parc import ParcEngine
+from para_placement.presolve import presolve, reject_infeasible_sfcs
 
 
-def linear_programming(model: Model) -> (float, int, float, float):
+def linear_programming(model: Model, reuse: bool = False, lp: IncrementalPlacementLP = None) \
+        -> (float, int, float, float):
+    """
+    reuse: start from the configurations the sfcs already have, see _reuse_and_solve
+    lp: solve by updating this LP, kept from the last solve (of another K, sfc list or batch),
+        only with LP_SOLVER 'highs' without LP_BLOCKS, unused by CG
+    """
     print(">>> Start LP <<<")
-    problem = LpProblem("VNF Placement", LpMaximize)
 
+    # parabox_naive counts the edges by the strategy, its configurations are only enumerated
+    if config.COLUMN_GENERATION and config.state != config.Setting.parabox_naive:
+        with Timer(verbose_msg=f'[CG] Elapsed time: {{}}'):
+            cg_lp = column_generation(model)
+        obj_val = cg_lp.objective
+        print(cg_lp)
+        print("ParaAnalyzer cache: {}".format(pa_cache))
+    elif reuse:
+        obj_val = _reuse_and_solve(model, lp)
+    else:
+        obj_val = _enumerate_and_solve(model, lp)
+
+    accept_sfc_number = sum(len(sfc.configurations) >
+                            0 for sfc in model.sfc_list)
+    latency = 0
+    if accept_sfc_number is not 0:
+        latency = sum(
+            configuration.get_latency() * configuration.var.varValue for sfc in model.sfc_list for configuration in
+            sfc.configurations) / accept_sfc_number
+    print("Objective Value: {}({}, {}ms)".format(
+        obj_val, accept_sfc_number, latency))
+
+    return obj_val, accept_sfc_number, latency, model.compute_resource_utilization()
+
+
+def _enumerate_and_solve(model: Model, lp: IncrementalPlacementLP = None) -> float:
     with Timer(verbose_msg=f'[GenC] Elapsed time: {{}}'), PixelBar("Generating configuration sets") as bar:
         bar.max = len(model.sfc_list)
         for sfc in model.sfc_list:
-            sfc.configurations = generate_configurations(model.topo, sfc)
+            sfc.configurations = []
+            sfc.pool = None
+            sfc.servers = None
+        sfc_list = model.sfc_list
+        if config.LP_PRESOLVE:
+            rejected = reject_infeasible_sfcs(model)
+            sfc_list = [sfc for sfc in sfc_list if sfc not in rejected]
+            bar.next(len(rejected))
+        workers = config.GC_WORKERS or os.cpu_count()
+        if workers > 1 and len(sfc_list) > 1:
+            configurations_list = generate_configurations_parallel(model.compiled, sfc_list, workers)
+        else:
+            configurations_list = (generate_configurations(model.compiled, sfc) for sfc in sfc_list)
+        for sfc, configurations in zip(sfc_list, configurations_list):
+            sfc.configurations = configurations
+            bar.next()
 
-            for configuration in sfc.configurations:
-                configuration.var = LpVariable(
-                    configuration.name, 0, 1, LpContinuous)
+    if config.LP_PRESOLVE:
+        with Timer(verbose_msg=f'[Presolve] Elapsed time: {{}}'):
+            duplicates, dominated = presolve(model)
+        print("Presolve: rejected {} infeasible sfcs, pruned {} duplicate and {} dominated configurations".format(
+            len(rejected), duplicates, dominated))
 
-            bar.next()
+    return _solve(model, lp)
 
+
+def _reuse_and_solve(model: Model, lp: IncrementalPlacementLP = None) -> float:
+    """
+    Solve the LP of a sub model of the ROR recursion with the configurations left by its parent.
+    The configurations of each sfc which still fit in the residual capacities are kept, new ones are only
+    generated for the sfcs keeping less than config.ROR_TOP_UP of them, and added if they are not kept already.
+    """
+    with Timer(verbose_msg=f'[ReuseC] Elapsed time: {{}}'):
+        ledger = model.ledger()
+        kept_num = generated_num = 0
+        for sfc in model.sfc_list:
+            kept = [configuration for configuration in sfc.configurations if ledger.fits(sfc, configuration)]
+            if sfc.configurations and len(kept) < config.ROR_TOP_UP * len(sfc.configurations):
+                names = {configuration.name for configuration in kept}
+                placements = {(tuple(configuration.route), tuple(configuration.place)) for configuration in kept}
+                for configuration in generate_configurations(model.compiled, sfc):
+                    if (tuple(configuration.route), tuple(configuration.place)) in placements:
+                        continue
+                    # regenerated configurations are primed when their name is taken
+                    while configuration.name in names:
+                        configuration.idx = "{}'".format(configuration.idx)
+                    names.add(configuration.name)
+                    kept.append(configuration)
+                    generated_num += 1
+            kept_num += len(kept)
+            sfc.configurations = kept
+        print("Configurations kept: {}\tgenerated: {}".format(kept_num - generated_num, generated_num))
+
+    if config.LP_PRESOLVE:
+        with Timer(verbose_msg=f'[Presolve] Elapsed time: {{}}'):
+            duplicates, dominated = presolve(model)
+        print("Presolve: pruned {} duplicate and {} dominated configurations".format(duplicates, dominated))
+
+    return _solve(model, lp)
+
+
+def _solve(model: Model, lp: IncrementalPlacementLP = None) -> float:
     # total number of valid sfc
     config_num = sum(len(sfc.configurations) for sfc in model.sfc_list)
     valid_sfc_num = sum(len(sfc.configurations) > 0 for sfc in model.sfc_list)
     print("Number of LP Variables: {}\tValid SFC: {}".format(
         config_num, valid_sfc_num))
+    print("ParaAnalyzer cache: {}".format(pa_cache))
+    print("Route cache: {}".format(route_cache))
+
+    if config.LP_SOLVER == 'highs' and not config.LP_BLOCKS and lp is not None:
+        obj_val = _solve_incremental(model, lp)
+    elif config.LP_SOLVER == 'highs':
+        obj_val = _solve_highs(model)
+    elif config.LP_SOLVER == 'packing':
+        obj_val = _solve_packing(model)
+    else:
+        obj_val = _solve_pulp(model)
+
+    # the next (sub) problem enumerates fewer configurations
+    config.K = max(config.K / 3 * 2, config.K_MIN)
+    return obj_val
+
+
+def _solve_pulp(model: Model) -> float:
+    problem = LpProblem("VNF Placement", LpMaximize)
+    topo = model.compiled
+
+    with Timer(verbose_msg=f'[LP Build] Elapsed time: {{}}'):
+        for sfc in model.sfc_list:
+            for configuration in sfc.configurations:
+                configuration.var = LpVariable(
+                    configuration.name, 0, 1, LpContinuous)
 
-    with Timer(verbose_msg=f'[LP Solving] Elapsed time: {{}}'):
         # Objective function
         problem += lpSum((configuration.var for configuration in sfc.configurations)
                          for sfc in model.sfc_list), "Total number of accepted requests"
@@ -39,37 +156,61 @@ def linear_programming(model: Model) -> (float, int, float, float):
             problem += lpSum(
                 configuration.var for configuration in sfc.configurations) <= 1.0, "Basic_{}".format(sfc.idx)
 
+        # one pass over the resource footprints
+        cr_terms = [[] for i in range(topo.n)]
+        tp_terms = [[] for i in range(topo.m)]
+        for sfc in model.sfc_list:
+            for configuration in sfc.configurations:
+                for index, usage in configuration.computing_resource.items():
+                    cr_terms[index].append(configuration.var * usage)
+                for eid, count in configuration.edges.items():
+                    tp_terms[eid].append(configuration.var * sfc.throughput * count)
+
         # computing resource constraints
-        for index, info in model.topo.nodes.data():
-            problem += lpSum(configuration.var * configuration.computing_resource[index]
-                             for sfc in model.sfc_list
-                             for configuration in sfc.configurations
-                             if index in configuration.computing_resource) <= info[
-                           'computing_resource'], "CR_{}".format(index)
+        for index in range(topo.n):
+            problem += lpSum(cr_terms[index]) <= topo.cpu[index], "CR_{}".format(topo.names[index])
 
         # throughput constraints
-        for start, end, info in model.topo.edges.data():
-            problem += lpSum(configuration.var * sfc.throughput * configuration.edges[(start, end)]
-                             for sfc in model.sfc_list
-                             for configuration in sfc.configurations
-                             if (start, end) in configuration.edges) <= info['bandwidth'], "TP_{}_{}".format(start, end)
+        for eid, (start, end) in enumerate(topo.edge_ends):
+            problem += lpSum(tp_terms[eid]) <= topo.bandwidth[eid], "TP_{}_{}".format(
+                topo.names[start], topo.names[end])
 
+    with Timer(verbose_msg=f'[LP Solving] Elapsed time: {{}}'):
         problem.solve()
 
-    config.K = max(config.K / 3 * 2, config.K_MIN)
+    return value(problem.objective)
 
-    obj_val = value(problem.objective)
-    accept_sfc_number = sum(len(sfc.configurations) >
-                            0 for sfc in model.sfc_list)
-    latency = 0
-    if accept_sfc_number is not 0:
-        latency = sum(
-            configuration.get_latency() * configuration.var.varValue for sfc in model.sfc_list for configuration in
-            sfc.configurations) / accept_sfc_number
-    print("Objective Value: {}({}, {}ms)".format(
-        obj_val, accept_sfc_number, latency))
 
-    return obj_val, accept_sfc_number, latency, model.compute_resource_utilization()
+def _solve_highs(model: Model) -> float:
+    with Timer(verbose_msg=f'[LP Build] Elapsed time: {{}}'):
+        lp = PlacementLP(model)
+    print(lp)
+
+    with Timer(verbose_msg=f'[LP Solving] Elapsed time: {{}}'):
+        obj_val = lp.solve(config.LP_BLOCKS, config.LP_WORKERS or os.cpu_count())
+    if config.LP_BLOCKS:
+        print("LP blocks: {}".format(lp.n_blocks))
+    return obj_val
+
+
+def _solve_packing(model: Model) -> float:
+    with Timer(verbose_msg=f'[LP Build] Elapsed time: {{}}'):
+        lp = PlacementLP(model)
+    print(lp)
+
+    with Timer(verbose_msg=f'[LP Packing] Elapsed time: {{}}'):
+        obj_val = lp.solve_packing(config.LP_EPSILON)
+    print("Packing: {} <= optimum <= {}".format(obj_val, lp.bound))
+    return obj_val
+
+
+def _solve_incremental(model: Model, lp: IncrementalPlacementLP) -> float:
+    with Timer(verbose_msg=f'[LP Build] Elapsed time: {{}}'):
+        lp.sync(model)
+    print(lp)
+
+    with Timer(verbose_msg=f'[LP Solving] Elapsed time: {{}}'):
+        return lp.solve()
 
 
 def rounding_one(model: Model):
@@ -84,12 +225,12 @@ def rounding_one(model: Model):
     sfc_list = list(filter(lambda s: len(
         s.configurations) > 0, model.sfc_list))
 
+    ledger = model.ledger()
     for sfc in sfc_list:
         for configuration in sfc.configurations:
             if configuration.var.varValue == 1:
-                sfc.accepted_configuration = configuration
-                if not evaluate(model):
-                    sfc.accepted_configuration = None
+                if ledger.try_accept(sfc, configuration):
+                    sfc.accepted_configuration = configuration
                 break
 
     if not model.get_accepted_sfc_list():
@@ -99,18 +240,21 @@ def rounding_one(model: Model):
 
 def rounding_randomized(model: Model):
     print(">> Randomized Rounding <<")
+    _randomized_pass(model)
+
+
+def _randomized_pass(model: Model, rng=random):
     sfc_list = list(filter(lambda s: len(
         s.configurations) > 0, model.sfc_list))
 
+    ledger = model.ledger()
     for sfc in sfc_list:
         for configuration in sfc.configurations:
-            prob = random.random()
+            prob = rng.random()
             if prob < configuration.var.varValue:
-                sfc.accepted_configuration = configuration
-                if evaluate(model):
+                if ledger.try_accept(sfc, configuration):
+                    sfc.accepted_configuration = configuration
                     break
-                else:
-                    sfc.accepted_configuration = None
 
 
 def rounding_greedy(model: Model):
@@ -123,6 +267,13 @@ def rounding_greedy(model: Model):
     :return:
     """
     print(">> Greedy Rounding <<")
+    _greedy_pass(model)
+
+    if not model.get_accepted_sfc_list():
+        PARC(model)
+
+
+def _greedy_pass(model: Model):
     sfc_list = list(filter(lambda s: len(
         s.configurations) > 0, model.sfc_list))
 
@@ -132,44 +283,108 @@ def rounding_greedy(model: Model):
 
     # sfc sorted by computing resource ratio
     sfc_list.sort(
-        key=lambda s: s.configurations[0].computing_resource_ratio(model.topo))
+        key=lambda s: s.configurations[0].computing_resource_ratio(model.compiled))
 
+    ledger = model.ledger()
     for sfc in sfc_list:
         for configuration in sfc.configurations:
-            sfc.accepted_configuration = configuration
-            if evaluate(model):
+            if ledger.try_accept(sfc, configuration):
+                sfc.accepted_configuration = configuration
                 break
-            else:
-                sfc.accepted_configuration = None
+
+
+def rounding_best_of(model: Model) -> List[dict]:
+    """
+    Rounding method: config.ROUNDING_TRIALS trials from the same varValues, the first one greedy and the others
+    randomized with their own seed, run by a pool of config.ROUNDING_WORKERS processes (0 for one per cpu).
+    The trial accepting the most sfcs, then of least average latency, is kept.
+    Returns the report of each trial: method, seed, accepted, latency.
+    """
+    print(">> Best of {} Rounding <<".format(config.ROUNDING_TRIALS))
+    base_seed = random.randrange(2 ** 32)
+    trials = [('greedy' if i == 0 else 'randomized', base_seed + i) for i in range(config.ROUNDING_TRIALS)]
+
+    workers = min(config.ROUNDING_WORKERS or os.cpu_count(), len(trials))
+    if workers > 1:
+        with multiprocessing.Pool(workers, _init_rounding_worker, (model, config.state)) as pool:
+            results = pool.map(_rounding_trial_task, trials, chunksize=1)
+    else:
+        results = [_rounding_trial(model, method, seed) for method, seed in trials]
+
+    reports = []
+    for i, ((method, seed), (positions, accepted, latency)) in enumerate(zip(trials, results)):
+        reports.append({'method': method, 'seed': seed, 'accepted': accepted, 'latency': latency})
+        print("Trial {}: {}\tseed: {}\taccepted: {}\tlatency: {}".format(i, method, seed, accepted, latency))
+
+    best = max(range(len(results)), key=lambda i: (results[i][1], -results[i][2], -i))
+    print("Best trial: {}".format(best))
+    for sfc, position in zip(model.sfc_list, results[best][0]):
+        if position >= 0:
+            sfc.accepted_configuration = sfc.configurations[position]
 
     if not model.get_accepted_sfc_list():
         PARC(model)
+    return reports
+
+
+def _rounding_trial(model: Model, method: str, seed: int) -> (List[int], int, float):
+    """
+    One trial of rounding_best_of, model is left as it was.
+    Returns the position of the configuration each sfc accepts in sfc.configurations (-1 for none),
+    the number of sfcs accepted and their average latency.
+    """
+    configurations_list = [sfc.configurations[:] for sfc in model.sfc_list]
+    accepted_list = [sfc.accepted_configuration for sfc in model.sfc_list]
+    if method == 'greedy':
+        _greedy_pass(model)
+    else:
+        _randomized_pass(model, random.Random(seed))
+
+    positions = []
+    latencies = []
+    for sfc, configurations, accepted in zip(model.sfc_list, configurations_list, accepted_list):
+        position = -1
+        if sfc.accepted_configuration is not accepted:
+            position = next(i for i, c in enumerate(configurations) if c is sfc.accepted_configuration)
+            latencies.append(sfc.accepted_configuration.get_latency())
+        positions.append(position)
+        sfc.configurations = configurations
+        sfc.accepted_configuration = accepted
+    return positions, len(latencies), sum(latencies) / len(latencies) if latencies else 0
+
+
+_worker_model: Model = None
+
+
+def _init_rounding_worker(model: Model, state: config.Setting):
+    global _worker_model
+    _worker_model = model
+    config.state = state
+
+
+def _rounding_trial_task(trial: tuple):
+    return _rounding_trial(_worker_model, *trial)
 
 
 # recursively
-def rounding_to_integral(model: Model, rounding_method=rounding_greedy) -> (float, int, float, float):
+def rounding_to_integral(model: Model, rounding_method=rounding_greedy, lp: IncrementalPlacementLP = None) \
+        -> (float, int, float, float):
+    """
+    rounding_method: rounding_one, rounding_greedy, rounding_randomized or rounding_best_of,
+        accepts configurations of model from their varValue
+    """
     print(">>> Start Rounding <<<")
 
     rounding_method(model)
 
     accepted_sfc_list = model.get_accepted_sfc_list()
 
-    sub_model = Model(copy.deepcopy(model.topo), [
-        sfc for sfc in model.sfc_list if sfc.accepted_configuration is None])
-    # computing resource reduction
-    for index, info in sub_model.topo.nodes.data():
-        info['computing_resource'] -= sum(sfc.accepted_configuration.computing_resource[index]
-                                          for sfc in accepted_sfc_list
-                                          if index in sfc.accepted_configuration.computing_resource)
-    # throughput reduction
-    for start, end, info in sub_model.topo.edges.data():
-        info['bandwidth'] -= sum(sfc.throughput * sfc.accepted_configuration.edges[(start, end)]
-                                 for sfc in accepted_sfc_list
-                                 if (start, end) in sfc.accepted_configuration.edges)
+    sub_model = model.reduce()
+    sub_model.sfc_list = [sfc for sfc in model.sfc_list if sfc.accepted_configuration is None]
 
     if accepted_sfc_list:
-        linear_programming(sub_model)
-        rounding_to_integral(sub_model, rounding_method)
+        linear_programming(sub_model, reuse=config.ROR_REUSE, lp=lp)
+        rounding_to_integral(sub_model, rounding_method, lp)
 
     obj_val = objective_value(model)
     accept_sfc_number = len(model.get_accepted_sfc_list())
@@ -180,45 +395,62 @@ def rounding_to_integral(model: Model, rounding_method=rounding_greedy) -> (floa
     return obj_val, accept_sfc_number, latency, model.compute_resource_utilization()
 
 
-def ROR(model: Model):
-    return rounding_to_integral(model, rounding_one)
+def ROR(model: Model, lp: IncrementalPlacementLP = None):
+    return rounding_to_integral(model, rounding_best_of if config.ROUNDING_BEST_OF else rounding_one, lp)
 
 
 # Greedy
 # validate configurationa and if valid, remove configuration from topo
-def is_configuration_valid(topo, sfc, configuration, debug=False):
+def is_configuration_valid(topo: CompiledTopology, sfc, configuration, debug=False):
     if sfc.latency < configuration.get_latency():
         if debug:
             print("Latency contraint violation: {}+?={} / {}".format(
                 configuration.route_latency, configuration.get_latency(), sfc.latency))
         return False
 
-    for node_pos in configuration.computing_resource:
-        if configuration.computing_resource[node_pos] > topo.nodes[node_pos]['computing_resource']:
+    computing_resource = configuration.computing_resource
+    for node_pos, usage in computing_resource.items():
+        if usage > topo.cpu[node_pos]:
             if debug:
                 print("Computing contraint violation: {}: {} / {}".format(
-                    node_pos, configuration.computing_resource[node_pos], topo.nodes[node_pos]['computing_resource']))
+                    topo.names[node_pos], usage, topo.cpu[node_pos]))
             return False
 
-    for edge in configuration.edges:
-        if sfc.throughput * configuration.edges[edge] > topo.edges.get(edge)['bandwidth']:
+    edges = configuration.edges
+    for edge, count in edges.items():
+        if sfc.throughput * count > topo.bandwidth[edge]:
             if debug:
+                start, end = topo.edge_ends[edge]
                 print("Throughput contraint violation: {}: {} * {} / {}".format(
-                    edge, configuration.edges[edge], sfc.throughput, topo.edges.get(edge)['bandwidth']))
+                    (topo.names[start], topo.names[end]), count, sfc.throughput,
+                    topo.bandwidth[edge]))
             return False
 
-    for node_pos in configuration.computing_resource:
-        topo.nodes[node_pos]['computing_resource'] -= configuration.computing_resource[node_pos]
+    for node_pos, usage in computing_resource.items():
+        topo.cpu[node_pos] -= usage
 
-    for start, end, info in topo.edges.data():
-        edge = (start, end)
-        if edge in configuration.edges:
-            topo.edges.get(edge)['bandwidth'] -= sfc.throughput * \
-                                                 configuration.edges[edge]
+    for edge, count in edges.items():
+        topo.bandwidth[edge] -= sfc.throughput * count
 
     return True
 
 
+def _placement_pass(model: Model, sfcs: List[SFC], place):
+    """
+    Place sfcs in order by place(engine, sfc) on a new ParcEngine searching by config.GREEDY_SEARCH and accept them.
+    With 'beam', ParcEngine.placements falls back to the greedy dfs for each sfc the beam search does not place.
+    """
+    engine = ParcEngine(model.ledger().topo, config.GREEDY_SEARCH)
+    with Timer() as timer, PixelBar("SFC placement ({})".format(config.GREEDY_SEARCH)) as bar:
+        bar.max = len(sfcs)
+        for sfc in sfcs:
+            configuration = place(engine, sfc)
+            if configuration is not None:
+                sfc.accepted_configuration = configuration
+            bar.next()
+    print("{}\tSFCs per second: {}".format(engine, len(sfcs) / max(timer.elapsed, 1e-9)))
+
+
 def greedy_dc(model: Model) -> (float, int, float, float):
     """
     Greedy thought:
@@ -230,17 +462,17 @@ def greedy_dc(model: Model) -> (float, int, float, float):
     """
     print(">>> Greedy Start <<<")
 
-    topo = copy.deepcopy(model.topo)
     sfcs = model.sfc_list[:]
     sfcs.sort(key=lambda x: x.computing_resources_sum)
 
-    with Timer(verbose_msg=f'[Greedy] Elapsed time: {{}}'), PixelBar("SFC placement") as bar:
-        bar.max = len(sfcs)
-        for sfc in sfcs:
-            configuration = generate_configuration_greedy_dfs(topo, sfc)
-            if configuration and is_configuration_valid(topo, sfc, configuration):
-                sfc.accepted_configuration = configuration
-            bar.next()
+    def place(engine: ParcEngine, sfc: SFC) -> Configuration:
+        for configuration in engine.placements(sfc):
+            if engine.try_accept(sfc, configuration):
+                return configuration
+        return None
+
+    with Timer(verbose_msg=f'[Greedy] Elapsed time: {{}}'):
+        _placement_pass(model, sfcs, place)
 
     obj_val = objective_value(model)
     accept_sfc_number = len(model.get_accepted_sfc_list())
@@ -262,38 +494,35 @@ def PARC(model: Model):
     """
     print(">>> Para Greedy Start <<<")
 
-    topo = copy.deepcopy(model.topo)
     sfcs = model.sfc_list[:]
     sfcs.sort(key=lambda sfc: sfc.computing_resources_sum)
 
-    with Timer(verbose_msg=f'[ParaGreedy] Elapsed time: {{}}'), PixelBar("SFC placement") as bar:
-        bar.max = len(sfcs)
-        for sfc in sfcs:
-            optimal_sfc = SFC(
-                sfc.pa.opt_vnf_list[:], sfc.latency, sfc.throughput, sfc.s, sfc.d, sfc.idx)
-
-            optimal_config = generate_configuration_greedy_dfs(
-                topo, optimal_sfc)
-            if optimal_config:  # generate origin "place" from the merged "place"
-                merged_vnf_index = 0
-                place = [optimal_config.place[0]]
-                for para in sfc.pa.opt_strategy:
-                    if para == 0:
-                        merged_vnf_index += 1
-                    place.append(optimal_config.place[merged_vnf_index])
-
-                configuration = Configuration(
-                    sfc, optimal_config.route, place, optimal_config.route_latency, optimal_config.idx)
-                if is_configuration_valid(topo, sfc, configuration):
-                    sfc.accepted_configuration = configuration
-
-            if not sfc.accepted_configuration:
-                configuration = generate_configuration_greedy_dfs(topo, sfc)
-                if configuration and is_configuration_valid(topo, sfc, configuration):
-                    sfc.accepted_configuration = configuration
-            # else reject
-
-            bar.next()
+    def place(engine: ParcEngine, sfc: SFC) -> Configuration:
+        optimal_sfc = SFC(
+            sfc.pa.opt_vnf_list[:], sfc.latency, sfc.throughput, sfc.s, sfc.d, sfc.idx)
+
+        for optimal_config in engine.placements(optimal_sfc):
+            # generate origin "place" from the merged "place"
+            merged_vnf_index = 0
+            place = [optimal_config.place[0]]
+            for para in sfc.pa.opt_strategy:
+                if para == 0:
+                    merged_vnf_index += 1
+                place.append(optimal_config.place[merged_vnf_index])
+
+            configuration = Configuration(
+                engine.topo, sfc, optimal_config.route, place, optimal_config.route_latency, optimal_config.idx)
+            if engine.try_accept(sfc, configuration):
+                return configuration
+
+        for configuration in engine.placements(sfc):
+            if engine.try_accept(sfc, configuration):
+                return configuration
+        # reject
+        return None
+
+    with Timer(verbose_msg=f'[ParaGreedy] Elapsed time: {{}}'):
+        _placement_pass(model, sfcs, place)
 
     obj_val = objective_value(model)
     accept_sfc_number = len(model.get_accepted_sfc_list())
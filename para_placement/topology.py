@@ -1,13 +1,20 @@
+import bisect
 import random
 import warnings
+from collections import OrderedDict
+from typing import List
 
 import math
 import matplotlib.cbook
 import matplotlib.pyplot as plt
 import networkx as nx
+import numpy
+import scipy.sparse
+from scipy.sparse.csgraph import dijkstra
 
+import para_placement.config as config
 from para_placement.config import TOPO_CONFIG
-from para_placement.helper import extract_filename
+from para_placement.helper import extract_filename, pairwise
 
 
 '''
@@ -158,3 +165,220 @@ def vl2_topo(port_num_of_aggregation_switch=4, port_num_of_tor_for_server=2):
     topo.name = 'VL2'
 
     return topo
+
+
+class CompiledTopology(object):
+    """Integer indexed topology compiled from a networkx graph.
+
+    Nodes and edges get dense ids in the iteration order of the graph, adjacency
+    is stored in CSR form (indptr, indices, adj_edges) and node/edge attributes in
+    numpy arrays. Names are only kept for reporting.
+    It is immutable, residual capacities are kept by the ResidualTopology views made by fork().
+    """
+
+    def __init__(self, topo: nx.Graph):
+        self.name = topo.name
+        self.names = list(topo.nodes)
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+        self.n = len(self.names)
+
+        self.cpu = numpy.array([topo.nodes[name]['computing_resource'] for name in self.names], dtype=float)
+
+        # edge (u, v) has id eid, edge_index maps both directions to it
+        self.edge_ends = numpy.zeros((topo.number_of_edges(), 2), dtype=int)
+        self.bandwidth = numpy.zeros(topo.number_of_edges())
+        self.latency = numpy.zeros(topo.number_of_edges())
+        self.edge_index = {}
+        for eid, (start, end, info) in enumerate(topo.edges.data()):
+            u, v = self.index[start], self.index[end]
+            self.edge_ends[eid] = u, v
+            self.bandwidth[eid] = info['bandwidth']
+            self.latency[eid] = info['latency']
+            self.edge_index[(u, v)] = self.edge_index[(v, u)] = eid
+        self.m = len(self.edge_ends)
+        for array in (self.cpu, self.bandwidth, self.latency):
+            array.setflags(write=False)
+
+        # rows of the adjacency as python lists of (neighbor, eid) for the pure python searches,
+        # neighbors keep the order of topo[node]
+        self.adj = []
+        for u, name in enumerate(self.names):
+            row = []
+            for adj_name in topo[name]:
+                v = self.index[adj_name]
+                row.append((v, self.edge_index[(u, v)]))
+            self.adj.append(row)
+
+        # CSR adjacency
+        self.indptr = numpy.cumsum([0] + [len(row) for row in self.adj])
+        self.indices = numpy.array([v for row in self.adj for v, eid in row], dtype=int)
+        self.adj_edges = numpy.array([eid for row in self.adj for v, eid in row], dtype=int)
+
+    def __str__(self):
+        return "<{}> nodes: {}\tedges: {}".format(self.name, self.n, self.m)
+
+    def fork(self):
+        """A view with its own residual capacities, starting from the capacities of self."""
+        return ResidualTopology(self)
+
+    def servers(self) -> List[int]:
+        return numpy.flatnonzero(self.cpu > 0).tolist()
+
+    def route_edges(self, route: List[int]) -> List[int]:
+        return [self.edge_index[edge] for edge in pairwise(route)]
+
+    def route_names(self, route: List[int]) -> List:
+        return [self.names[node] for node in route]
+
+
+class ResidualTopology(CompiledTopology):
+    """Residual capacities overlaid on a shared CompiledTopology.
+
+    The structure (ids, adjacency, latency, names) is shared with the base, only cpu and
+    bandwidth are owned by the view, so fork() costs two array copies instead of a graph copy.
+    commit() writes the residual capacities back to the view it was forked from, which must be a
+    ResidualTopology: the capacities of a CompiledTopology are read-only.
+    """
+
+    def __init__(self, parent: CompiledTopology):
+        self.__dict__.update(parent.__dict__)
+        self.base = parent.base if isinstance(parent, ResidualTopology) else parent
+        self.parent = parent
+        self.cpu = parent.cpu.copy()
+        self.bandwidth = parent.bandwidth.copy()
+
+    def __str__(self):
+        return "<{}> nodes: {}\tedges: {}\tcpu used: {}\tbandwidth used: {}".format(
+            self.name, self.n, self.m, self.cpu_delta().sum(), self.bandwidth_delta().sum())
+
+    def cpu_delta(self) -> numpy.ndarray:
+        return self.base.cpu - self.cpu
+
+    def bandwidth_delta(self) -> numpy.ndarray:
+        return self.base.bandwidth - self.bandwidth
+
+    def commit(self):
+        if not isinstance(self.parent, ResidualTopology):
+            raise ValueError("commit: {} is forked from a read-only CompiledTopology, "
+                             "fork a ResidualTopology from it to commit to".format(self.name))
+        self.parent.cpu[:] = self.cpu
+        self.parent.bandwidth[:] = self.bandwidth
+
+
+class ServerIndex(object):
+    """Nodes of a topology ordered by residual cpu, the largest first and the smallest id on ties.
+
+    sync(topo) follows the cpu of topo, updating only the nodes changed since the last sync,
+    set(node, cpu) updates one node, e.g. on the accept or the release of a vnf.
+    The order is a list of sorted chunks of (-cpu, node) of at most 2 * _LOAD entries: an update bisects the last
+    entries of the chunks then one chunk, O(log n) comparisons and the move of at most 2 * _LOAD entries,
+    and the first nodes are read by slicing the chunks in turn.
+    The latencies from a node, for within, are computed on first use and kept until the structure changes,
+    for the config.SERVER_LATENCY_CACHE_SIZE (size if given) sources used last.
+    """
+
+    _LOAD = 256
+
+    def __init__(self, size: int = None):
+        self.size = size
+        self._structure = None
+        self.cpu = []
+        self._chunks = []
+        # last entry of each chunk
+        self._maxes = []
+        self._latency = OrderedDict()
+
+    def __str__(self):
+        return "<ServerIndex> nodes: {}\tlatency sources: {}".format(len(self.cpu), len(self._latency))
+
+    def sync(self, topo: CompiledTopology):
+        structure = getattr(topo, 'base', topo)
+        if self._structure is not structure:
+            self._structure = structure
+            self.cpu = topo.cpu.tolist()
+            order = sorted((-cpu, node) for node, cpu in enumerate(self.cpu))
+            self._chunks = [order[i:i + self._LOAD] for i in range(0, len(order), self._LOAD)]
+            self._maxes = [chunk[-1] for chunk in self._chunks]
+            self._latency.clear()
+            return
+        for node in numpy.flatnonzero(topo.cpu != self.cpu).tolist():
+            self.set(node, float(topo.cpu[node]))
+
+    def set(self, node: int, cpu: float):
+        chunks, maxes = self._chunks, self._maxes
+        key = (-self.cpu[node], node)
+        i = bisect.bisect_left(maxes, key)
+        chunk = chunks[i]
+        del chunk[bisect.bisect_left(chunk, key)]
+        if chunk:
+            maxes[i] = chunk[-1]
+        else:
+            del chunks[i], maxes[i]
+
+        key = (-cpu, node)
+        self.cpu[node] = cpu
+        if not chunks:
+            chunks.append([key])
+            maxes.append(key)
+            return
+        i = min(bisect.bisect_left(maxes, key), len(maxes) - 1)
+        chunk = chunks[i]
+        bisect.insort(chunk, key)
+        maxes[i] = chunk[-1]
+        if len(chunk) > 2 * self._LOAD:
+            chunks[i:i + 1] = chunk[:self._LOAD], chunk[self._LOAD:]
+            maxes[i:i + 1] = chunks[i][-1], chunks[i + 1][-1]
+
+    def _count(self, requirement) -> int:
+        bound = (-requirement, math.inf)
+        i = bisect.bisect_right(self._maxes, bound)
+        count = sum(len(chunk) for chunk in self._chunks[:i])
+        if i < len(self._chunks):
+            count += bisect.bisect_right(self._chunks[i], bound)
+        return count
+
+    def top(self, requirement, count: int = None) -> List[int]:
+        """The count nodes of most cpu with at least requirement of it, all of them if count is None"""
+        bound = (-requirement, math.inf)
+        ret = []
+        for chunk, last in zip(self._chunks, self._maxes):
+            end = len(chunk) if last <= bound else bisect.bisect_right(chunk, bound)
+            if count is not None:
+                end = min(end, count - len(ret))
+            ret.extend(node for _, node in chunk[:end])
+            if end < len(chunk) or len(ret) == count:
+                break
+        return ret
+
+    def _latencies(self, v: int) -> tuple:
+        """(latency to each node, sorted latencies, nodes by latency) from v"""
+        entry = self._latency.get(v)
+        if entry is not None:
+            self._latency.move_to_end(v)
+            return entry
+        graph = scipy.sparse.csr_matrix((self._structure.latency[self._structure.adj_edges],
+                                         self._structure.indices, self._structure.indptr),
+                                        shape=(self._structure.n, self._structure.n))
+        latency = dijkstra(graph, indices=v)
+        nearest = numpy.argsort(latency, kind='stable')
+        entry = self._latency[v] = latency.tolist(), latency[nearest].tolist(), nearest.tolist()
+        size = self.size if self.size is not None else config.SERVER_LATENCY_CACHE_SIZE
+        while len(self._latency) > size:
+            self._latency.popitem(last=False)
+        return entry
+
+    def latencies(self, v: int) -> List[float]:
+        """Shortest path latency from v to each node, inf if unreachable"""
+        return self._latencies(v)[0]
+
+    def within(self, v: int, limit, requirement) -> List[int]:
+        """The nodes within latency limit of v with at least requirement cpu, ordered as top"""
+        latency, sorted_latency, nearest = self._latencies(v)
+
+        # filter the shorter of the two prefixes
+        near = bisect.bisect_right(sorted_latency, limit)
+        if near < self._count(requirement):
+            nodes = [node for node in nearest[:near] if self.cpu[node] >= requirement]
+            nodes.sort(key=lambda node: (-self.cpu[node], node))
+            return nodes
+        return [node for node in self.top(requirement) if latency[node] <= limit]
@@ -36,14 +36,16 @@ def main():
     vl2_model.draw_topo()
 
     result = dict()
+    # with LP_INCREMENTAL, the LP is updated from one probability to the next
+    lp = IncrementalPlacementLP(vl2_model.compiled) if config.LP_INCREMENTAL else None
     step = .2
     for prob in numpy.arange(0, 1.1, step):
         print("Parallelism Probability:", prob)
         vl2_model.print_sfc_list_feature()
-        result[prob] = iteration(model=vl2_model)
+        result[prob] = iteration(model=vl2_model, lp=lp)
         update_vnf_set_with_para_prob(vnf_set, step)
         for sfc in vl2_model.sfc_list:
-            sfc.pa = ParaAnalyzer(sfc.vnf_list)
+            sfc.pa = pa_cache.get(sfc.vnf_list)
 
     print_dict_result(result, vl2_model)
 
@@ -51,7 +53,7 @@ def main():
     save_obj(result, filename)
 
 
-def iteration(model: Model):
+def iteration(model: Model, lp: IncrementalPlacementLP = None):
     print("PLACEMENT MAIN")
     result = {}
 
@@ -60,8 +62,8 @@ def iteration(model: Model):
 
     config.K = 256
     model.clear()
-    linear_programming(model)
-    result['RORP'] = ROR(model)
+    linear_programming(model, lp=lp)
+    result['RORP'] = ROR(model, lp)
 
     return result
 
@@ -0,0 +1,208 @@
+import contextlib
+import io
+import itertools
+import random
+import unittest
+
+import networkx as nx
+
+from para_placement import cg, topology
+from para_placement.cg import RouteCache, _bfs_route_uncached, column_generation, generate_configurations, \
+    generate_configurations_parallel, route_cache
+from para_placement.lp import PlacementLP
+from para_placement.model import *
+
+
+class CGTestCase(unittest.TestCase):
+    def setUp(self):
+        self.routing = config.ROUTING
+        self.state = config.state
+        self.k = config.K
+        self.best_first = config.GC_BEST_FIRST
+        self.time_limit = cg.time_limit
+        random.seed(1)
+        self.compiled = CompiledTopology(topology.fat_tree_topo(4))
+
+    def _fork(self):
+        self.topo = self.compiled.fork()
+        # a few bandwidth levels
+        for eid in range(self.topo.m):
+            self.topo.bandwidth[eid] = random.choice([10, 20, 20, 30, 1000])
+
+    def tearDown(self):
+        config.ROUTING = self.routing
+        config.state = self.state
+        config.K = self.k
+        config.GC_BEST_FIRST = self.best_first
+        cg.time_limit = self.time_limit
+
+    def _check(self, cache: RouteCache):
+        topo = self.topo
+        cache.sync(topo)
+        levels = numpy.unique(topo.bandwidth).tolist()
+        # on, below and above each level
+        throughputs = [tp + delta for tp in levels for delta in (-1, -.5, 0, .5)]
+        for i in range(200):
+            s, d = random.sample(range(topo.n), 2)
+            for tp in random.sample(throughputs, 4):
+                route, latency = _bfs_route_uncached(topo, s, d, tp)
+                self.assertEqual((tuple(route), latency), cache.get(topo, s, d, tp), (s, d, tp))
+
+    def test_route_cache(self):
+        for routing in ('bfs', 'latency'):
+            config.ROUTING = routing
+            self._fork()
+            cache = RouteCache()
+            self._check(cache)
+            self.assertGreater(cache.hits, 0)
+
+            invalidations = cache.invalidations
+            self.topo.bandwidth[:self.topo.m // 2] -= 5
+            self._check(cache)
+            server = self.topo.servers()[0]
+            self.topo.cpu[server] = 0
+            self._check(cache)
+            config.ROUTING = 'latency' if routing == 'bfs' else 'bfs'
+            self._check(cache)
+            self.assertEqual(invalidations + 3, cache.invalidations)
+
+    @staticmethod
+    def _placements(topo: CompiledTopology, sfc: SFC) -> List:
+        """(latency, route, place) of every configuration of the best first search, by brute force"""
+        d = topo.index[sfc.d]
+        m = len(sfc.vnf_list)
+        min_usage = min(vnf.computing_resource for vnf in sfc.vnf_list)
+        servers = [node for node in topo.servers() if topo.cpu[node] >= min_usage]
+        ret = []
+
+        def search(node, k, route, place, route_latency, used):
+            if k == m:
+                sub_route, sub_latency = route_cache.get(topo, node, d, sfc.throughput)
+                if sub_route:
+                    configuration = Configuration(topo, sfc, route + list(sub_route), place,
+                                                  route_latency + sub_latency, 0)
+                    if configuration.get_latency() <= sfc.latency:
+                        ret.append((configuration.get_latency(), configuration.route, configuration.place))
+                return
+            for server in servers:
+                sub_route, sub_latency = route_cache.get(topo, node, server, sfc.throughput)
+                if server in used or not sub_route:
+                    continue
+                sub_route = route + list(sub_route[:-1])
+                for j in range(k + 1, m + 1):
+                    if sum(vnf.computing_resource for vnf in sfc.vnf_list[k:j]) > topo.cpu[server]:
+                        break
+                    search(server, j, sub_route, place + [len(sub_route)] * (j - k), route_latency + sub_latency,
+                           used | {server})
+
+        search(topo.index[sfc.s], 0, [], [], 0, set())
+        ret.sort(key=lambda placement: placement[0])
+        return ret
+
+    def test_best_first(self):
+        config.state = config.Setting.flexchain
+        config.GC_BEST_FIRST = True
+        config.K = 50
+        topo = self.compiled.fork()
+        # five servers left
+        for server in topo.servers()[5:]:
+            topo.cpu[server] = 0
+        route_cache.sync(topo)
+        tested = 0
+        for sfc in generate_sfc_list2(topology.fat_tree_topo(4), generate_vnf_set(30), 12):
+            expected = self._placements(topo, sfc)
+            if len(expected) < config.K:
+                continue
+            configurations = generate_configurations(topo, sfc)
+            latencies = [configuration.get_latency() for configuration in configurations]
+            self.assertEqual(config.K, len(configurations))
+            # non decreasing, up to float rounding
+            self.assertTrue(all(a <= b + 1e-9 for a, b in zip(latencies, latencies[1:])))
+            for latency, (expected_latency, route, place) in zip(latencies, expected):
+                self.assertAlmostEqual(expected_latency, latency)
+            # the same configurations, but the order of equal latencies
+            found = [(configuration.route, configuration.place) for configuration in configurations]
+            for expected_latency, route, place in expected:
+                if expected_latency < latencies[-1] - 1e-9:
+                    self.assertIn((route, place), found)
+            tested += 1
+        self.assertGreater(tested, 3)
+
+    def test_parallel(self):
+        config.state = config.Setting.flexchain
+        config.K = 32
+        # no timeout, the generation is deterministic
+        cg.time_limit = 60
+        topo = self.compiled.fork()
+        sfc_list = generate_sfc_list2(topology.fat_tree_topo(4), generate_vnf_set(30), 20)
+        for best_first in (False, True):
+            config.GC_BEST_FIRST = best_first
+            expected = [generate_configurations(topo, sfc) for sfc in sfc_list]
+            found = list(generate_configurations_parallel(topo, sfc_list, 3))
+            self.assertEqual(len(sfc_list), len(found))
+            self.assertGreater(sum(map(len, found)), len(sfc_list))
+            for configurations, parallel in zip(expected, found):
+                self.assertEqual([(c.route, c.place, c.route_latency, c.idx) for c in configurations],
+                                 [(c.route, c.place, c.route_latency, c.idx) for c in parallel])
+
+    @staticmethod
+    def _walks(topo: CompiledTopology, sfc: SFC) -> List:
+        """(route, place) of every configuration in the space of the pricing, by brute force"""
+        d = topo.index[sfc.d]
+        m = len(sfc.vnf_list)
+        cpu_prefix = [0, *itertools.accumulate(vnf.computing_resource for vnf in sfc.vnf_list)]
+        ret = []
+
+        def arrive(node, k, route, place, servers, counts):
+            route = route + [node]
+            if topo.cpu[node] > 0 and node not in servers:
+                for j in range(k + 1, m + 1):
+                    if cpu_prefix[j] - cpu_prefix[k] > topo.cpu[node]:
+                        break
+                    leave(node, j, route, place + [len(route) - 1] * (j - k), servers | {node}, counts)
+            if topo.cpu[node] <= 0 or node == d:
+                leave(node, k, route, place, servers, counts)
+
+        def leave(node, k, route, place, servers, counts):
+            if node == d and k == m:
+                ret.append((route, place))
+                return
+            for adj_node, eid in topo.adj[node]:
+                if topo.bandwidth[eid] >= sfc.throughput * (counts.get(eid, 0) + 1):
+                    arrive(adj_node, k, route, place, servers, {**counts, eid: counts.get(eid, 0) + 1})
+
+        arrive(topo.index[sfc.s], 0, [], [], frozenset(), {})
+        return ret
+
+    def test_column_generation(self):
+        config.state = config.Setting.flexchain
+        for seed in range(3):
+            random.seed(seed)
+            # two switches of two servers, each edge used at most twice
+            graph = nx.Graph()
+            graph.name = 'tiny'
+            graph.add_edge("Core switch 0", "Core switch 1", bandwidth=250, latency=0.001)
+            for i in range(4):
+                graph.add_node("Core switch {}".format(i // 2), computing_resource=0)
+                graph.add_node("Server {}".format(i), computing_resource=random.randint(4000, 8000))
+                graph.add_edge("Server {}".format(i), "Core switch {}".format(i // 2), bandwidth=250, latency=0.001)
+            model = Model(graph, generate_sfc_list2(graph, generate_vnf_set(30), 20))
+
+            topo = model.compiled
+            for sfc in model.sfc_list:
+                sfc.throughput = 100
+                for route, place in self._walks(topo, sfc):
+                    route_latency = sum(topo.latency[eid] for eid in topo.route_edges(route))
+                    configuration = Configuration(topo, sfc, route, place, route_latency, len(sfc.configurations))
+                    if configuration.get_latency() <= sfc.latency:
+                        sfc.configurations.append(configuration)
+            optimum = PlacementLP(model).solve()
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                lp = column_generation(model)
+            self.assertAlmostEqual(optimum, lp.objective, places=5)
+            self.assertLess(optimum, len(model.sfc_list))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import random
+import unittest
+
+import networkx as nx
+
+from para_placement import topology
+from para_placement.cg import generate_configurations
+from para_placement.lp import IncrementalPlacementLP, PlacementLP
+from para_placement.model import *
+
+
+class LPTestCase(unittest.TestCase):
+    def setUp(self):
+        self.k = config.K
+        config.K = 32
+        self.model = self._model()
+
+    @staticmethod
+    def _model() -> Model:
+        random.seed(1)
+        topo = topology.fat_tree_topo(4)
+        model = Model(topo, generate_sfc_list2(topo, generate_vnf_set(30), 60))
+        for sfc in model.sfc_list:
+            sfc.configurations = generate_configurations(model.compiled, sfc)
+        return model
+
+    def tearDown(self):
+        config.K = self.k
+
+    def _check_feasible(self, lp: PlacementLP, objective: float):
+        x = numpy.array([configuration.varValue for configuration in lp.columns])
+        self.assertTrue(numpy.all(lp.A @ x <= lp.b + 1e-6))
+        self.assertAlmostEqual(objective, x.sum(), places=6)
+
+    def test_packing(self):
+        lp = PlacementLP(self.model)
+        optimum = lp.solve()
+        self._check_feasible(lp, optimum)
+        # the resources bind
+        self.assertLess(optimum, sum(len(sfc.configurations) > 0 for sfc in self.model.sfc_list) - 1)
+        self.assertAlmostEqual(optimum, lp.solve(blocks=True), places=6)
+
+        for epsilon in (.05, .1, .25):
+            objective = lp.solve_packing(epsilon)
+            self._check_feasible(lp, objective)
+            self.assertGreaterEqual(objective, (1 - epsilon) * optimum - 1e-6)
+            self.assertLessEqual(objective, optimum + 1e-6)
+            self.assertGreaterEqual(lp.bound, optimum - 1e-6)
+
+    def test_blocks(self):
+        random.seed(1)
+        # two fat trees sharing no node or edge, with the sfcs of each one
+        trees = [nx.relabel_nodes(topology.fat_tree_topo(4), lambda name: prefix + name) for prefix in ('A ', 'B ')]
+        topo = nx.union(*trees)
+        topo.name = 'fat tree pair'
+        vnf_set = generate_vnf_set(30)
+        model = Model(topo, generate_sfc_list2(trees[0], vnf_set, 40) + generate_sfc_list2(trees[1], vnf_set, 40, 40))
+        for sfc in model.sfc_list:
+            sfc.configurations = generate_configurations(model.compiled, sfc)
+
+        lp = PlacementLP(model)
+        self.assertGreaterEqual(len(lp.blocks()), 2)
+        optimum = lp.solve()
+        self.assertEqual(1, lp.n_blocks)
+        for workers in (1, 2):
+            objective = lp.solve(blocks=True, workers=workers)
+            self.assertEqual(len(lp.blocks()), lp.n_blocks)
+            self.assertAlmostEqual(optimum, objective, places=6)
+            self._check_feasible(lp, objective)
+
+    def _check_sync(self, lp: IncrementalPlacementLP, model: Model):
+        lp.sync(model)
+        objective = lp.solve()
+        self.assertAlmostEqual(PlacementLP(model).solve(), objective, places=6)
+        self.assertEqual(sum(len(sfc.configurations) for sfc in model.sfc_list), len(lp.columns))
+
+    def test_incremental(self):
+        for fallback in (False, True):
+            model = self._model()
+            lp = IncrementalPlacementLP(model.compiled)
+            if fallback:
+                # as without highspy
+                lp.highs = None
+            self._check_sync(lp, model)
+
+            # another K for half of the sfcs
+            config.K = 8
+            for sfc in model.sfc_list[::2]:
+                sfc.pool = None
+                sfc.configurations = generate_configurations(model.compiled, sfc)
+            self._check_sync(lp, model)
+
+            # the accepted sfcs leave, their resources are taken from the capacities
+            ledger = model.ledger()
+            for sfc in model.sfc_list[:20]:
+                if sfc.configurations and ledger.try_accept(sfc, sfc.configurations[0]):
+                    sfc.accepted_configuration = sfc.configurations[0]
+            sub_model = model.reduce()
+            sub_model.sfc_list = [sfc for sfc in model.sfc_list if sfc.accepted_configuration is None]
+            self.assertLess(len(sub_model.sfc_list), len(model.sfc_list))
+            self._check_sync(lp, sub_model)
+
+            # and other capacities
+            sub_model.compiled.cpu *= .5
+            sub_model.compiled.bandwidth[::3] = 0
+            self._check_sync(lp, sub_model)
+            config.K = 32
+
+
+if __name__ == '__main__':
+    unittest.main()
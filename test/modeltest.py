@@ -1,10 +1,19 @@
+import random
 import unittest
 import numpy
 
+from para_placement import topology
+from para_placement.cg import generate_configuration_greedy_dfs
 from para_placement.model import *
 
 
 class MyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.state = config.state
+
+    def tearDown(self):
+        config.state = self.state
+
     def test_vnf_para_prob(self):
         size = 30
         for prob in numpy.arange(.1, .9, .1):
@@ -36,6 +45,111 @@ class MyTestCase(unittest.TestCase):
                         para_num += 1
             self.assertEqual(int(prob * pairs), para_num)
 
+    def test_catalog_matrix(self):
+        random.seed(1)
+        for fields, size in ((5, 30), (64, 100), (3000, 200)):
+            vnf_list = [VNF(1, 1, set(random.sample(range(fields), random.randint(0, 5))),
+                            set(random.sample(range(fields), random.randint(0, 3)))) for i in range(size)]
+            catalog = VNFCatalog(vnf_list)
+            for i, vnf in enumerate(vnf_list):
+                for j, other in enumerate(vnf_list):
+                    if vnf.write_mask & other.read_mask:
+                        para = -1
+                    elif vnf.read_mask & other.write_mask or vnf.write_mask & other.write_mask:
+                        para = 0
+                    else:
+                        para = 1
+                    self.assertEqual(para, catalog.matrix[i, j])
+
+    def test_para_analyzer_dp(self):
+        random.seed(1)
+        for vnf_set in (generate_vnf_set(30), generate_vnf_set_with_para_prob(30, .5),
+                        generate_vnf_set_with_para_prob(30, .9)):
+            for i in range(200):
+                vnf_list = [random.choice(vnf_set) for j in range(random.randint(1, 9))]
+                dp = ParaAnalyzer(vnf_list, dp=True)
+                dfs = ParaAnalyzer(vnf_list, dp=False)
+                self.assertEqual(dfs.opt_latency, dp.opt_latency)
+                self.assertEqual(dfs.opt_strategy, dp.opt_strategy)
+                self.assertEqual([vnf.latency for vnf in dfs.opt_vnf_list], [vnf.latency for vnf in dp.opt_vnf_list])
+
+    def test_pa_cache_eviction(self):
+        vnf_set = generate_vnf_set(30)
+        a, b, c = vnf_set[:2], vnf_set[2:4], vnf_set[4:6]
+        cache = ParaAnalyzerCache(2)
+        pa = cache.get(a)
+        cache.get(b)
+        self.assertIs(pa, cache.get(a))
+        # b is the least recently used
+        cache.get(c)
+        self.assertIs(pa, cache.get(a))
+        cache.get(b)
+        self.assertEqual((2, 4), (cache.hits, cache.misses))
+        self.assertEqual(ParaAnalyzer(a).opt_latency, pa.opt_latency)
+
+    def test_pa_cache_invalidation(self):
+        vnf_set = generate_vnf_set_with_para_prob(10, 0)
+        vnf_list = vnf_set[:5]
+        self.assertEqual(sum(vnf.latency for vnf in vnf_list), pa_cache.get(vnf_list).opt_latency)
+        # every pair can run in parallel
+        update_vnf_set_with_para_prob(vnf_set, 1)
+        self.assertEqual(ParaAnalyzer(vnf_list).opt_latency, pa_cache.get(vnf_list).opt_latency)
+        self.assertLess(pa_cache.get(vnf_list).opt_latency, sum(vnf.latency for vnf in vnf_list))
+
+    def test_route_footprints(self):
+        random.seed(1)
+        topo = topology.fat_tree_topo(4)
+        compiled = CompiledTopology(topo)
+        sfc_list = generate_sfc_list2(topo, generate_vnf_set(30), 20)
+        for state in (config.Setting.parabox_naive, config.Setting.flexchain):
+            config.state = state
+            for sfc in sfc_list:
+                # a random walk, it may use an edge more than once
+                route = [random.randrange(compiled.n)]
+                for i in range(random.randint(0, 8)):
+                    route.append(random.choice(compiled.adj[route[-1]])[0])
+                places = [sorted(random.randrange(len(route)) for vnf in sfc.vnf_list) for i in range(5)]
+
+                nodes, usage, hosted, eids, counts = route_footprints(compiled, sfc, route, places)
+                for place, usage_row, hosted_row, counts_row in zip(places, usage, hosted, counts):
+                    # the footprint built sub route by sub route
+                    sfc.pool = None
+                    configuration = Configuration(compiled, sfc, route, place, 0, 0)
+                    self.assertEqual(configuration.computing_resource,
+                                     {node: cpu for node, cpu, placed in zip(nodes, usage_row, hosted_row) if placed})
+                    self.assertEqual(configuration.edges,
+                                     {eid: count for eid, count in zip(eids, counts_row) if count}, state)
+
+    def test_ledger(self):
+        random.seed(1)
+        topo = topology.fat_tree_topo(4)
+        model = Model(topo, generate_sfc_list2(topo, generate_vnf_set(30), 40))
+        ledger = model.ledger()
+        for sfc in model.sfc_list:
+            configuration = generate_configuration_greedy_dfs(ledger.topo, sfc)
+            if configuration is None:
+                continue
+            cpu, bandwidth = ledger.topo.cpu.copy(), ledger.topo.bandwidth.copy()
+            if not ledger.try_accept(sfc, configuration):
+                # nothing consumed
+                self.assertTrue(numpy.array_equal(cpu, ledger.topo.cpu))
+                self.assertTrue(numpy.array_equal(bandwidth, ledger.topo.bandwidth))
+                continue
+            sfc.accepted_configuration = configuration
+            for node, usage in configuration.computing_resource.items():
+                self.assertAlmostEqual(cpu[node] - usage, ledger.topo.cpu[node])
+            for eid, count in configuration.edges.items():
+                self.assertAlmostEqual(bandwidth[eid] - sfc.throughput * count, ledger.topo.bandwidth[eid])
+        accepted_sfc_list = model.get_accepted_sfc_list()
+        self.assertTrue(0 < len(accepted_sfc_list) < len(model.sfc_list))
+        self.assertTrue(numpy.allclose(model.ledger().topo.cpu, ledger.topo.cpu))
+        self.assertTrue(numpy.allclose(model.ledger().topo.bandwidth, ledger.topo.bandwidth))
+
+        for sfc in accepted_sfc_list:
+            ledger.release(sfc, sfc.accepted_configuration)
+        self.assertTrue(numpy.allclose(model.compiled.cpu, ledger.topo.cpu))
+        self.assertTrue(numpy.allclose(model.compiled.bandwidth, ledger.topo.bandwidth))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,71 @@
+import random
+import unittest
+
+from para_placement import topology
+from para_placement.cg import generate_configuration_greedy_dfs
+from para_placement.model import *
+from para_placement.parc import ParcEngine
+
+
+class ParcTestCase(unittest.TestCase):
+    def setUp(self):
+        self.state = config.state
+        self.beam_time = config.GREEDY_BEAM_TIME
+
+    def tearDown(self):
+        config.state = self.state
+        config.GREEDY_BEAM_TIME = self.beam_time
+
+    def test_place_as_greedy_dfs(self):
+        for state in config.Setting:
+            config.state = state
+            random.seed(1)
+            topo = topology.fat_tree_topo(4)
+            model = Model(topo, generate_sfc_list2(topo, generate_vnf_set(30), 40))
+            ledger = model.ledger()
+            engine = ParcEngine(ledger.topo, 'dfs')
+
+            accepted = rejected = 0
+            for sfc in model.sfc_list:
+                expected = generate_configuration_greedy_dfs(ledger.topo, sfc)
+                configuration = engine.place(sfc)
+                if expected is None:
+                    self.assertIsNone(configuration, state)
+                    rejected += 1
+                    continue
+                self.assertIsNotNone(configuration, state)
+                self.assertEqual((expected.route, expected.place, expected.route_latency),
+                                 (configuration.route, configuration.place, configuration.route_latency), state)
+                accept = ledger.try_accept(sfc, expected)
+                self.assertEqual(accept, engine.try_accept(sfc, configuration), state)
+                accepted += accept
+            # the resources run out midway
+            self.assertTrue(accepted and rejected, state)
+            self.assertEqual(engine.cpu, ledger.topo.cpu.tolist(), state)
+            self.assertEqual(engine.bandwidth, ledger.topo.bandwidth.tolist(), state)
+
+    def test_beam_search(self):
+        config.state = config.Setting.flexchain
+        # only the expansions bound the search
+        config.GREEDY_BEAM_TIME = math.inf
+        random.seed(1)
+        topo = topology.fat_tree_topo(4)
+        model = Model(topo, generate_sfc_list2(topo, generate_vnf_set(30), 40))
+        engine = ParcEngine(model.ledger().topo, 'beam')
+
+        accepted = 0
+        for sfc in sorted(model.sfc_list, key=lambda sfc: sfc.computing_resources_sum):
+            configuration = engine.beam_search(sfc)
+            if configuration is None:
+                self.assertIsNone(sfc.pool)
+                continue
+            # within the residual capacities, and the only row of the pool
+            self.assertLessEqual(configuration.get_latency(), sfc.latency)
+            self.assertTrue(engine.try_accept(sfc, configuration))
+            self.assertEqual(1, len(sfc.pool))
+            accepted += 1
+        self.assertEqual(15, accepted)
+
+
+if __name__ == '__main__':
+    unittest.main()
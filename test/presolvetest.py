@@ -0,0 +1,82 @@
+import random
+import unittest
+
+from para_placement import topology
+from para_placement.cg import generate_configurations
+from para_placement.model import *
+from para_placement.presolve import prune_configurations, reject_infeasible_sfcs
+
+
+class PresolveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.state = config.state
+        self.k = config.K
+        config.state = config.Setting.flexchain
+        config.K = 64
+        random.seed(1)
+        topo = topology.fat_tree_topo(4)
+        self.model = Model(topo, generate_sfc_list2(topo, generate_vnf_set(30), 10))
+
+    def tearDown(self):
+        config.state = self.state
+        config.K = self.k
+
+    def _copy(self, configuration: Configuration, detour: bool = False) -> Configuration:
+        """configuration again, through a switch and back on the first edge of its route if detour"""
+        topo = self.model.compiled
+        route = configuration.route
+        place = configuration.place
+        if detour:
+            switch = next(node for node, eid in topo.adj[route[0]] if topo.cpu[node] <= 0)
+            route = [route[0], switch, route[0], *route[1:]]
+            place = [pos + 2 if pos else 0 for pos in place]
+        route_latency = sum(topo.latency[eid] for eid in topo.route_edges(route))
+        return Configuration(topo, configuration.sfc, route, place, route_latency, len(configuration.sfc.configurations))
+
+    def test_prune(self):
+        tested = 0
+        for sfc in self.model.sfc_list:
+            configurations = generate_configurations(self.model.compiled, sfc)
+            if len(configurations) < 2:
+                continue
+            first = configurations[0]
+            other = next(configuration for configuration in configurations
+                         if configuration.computing_resource != first.computing_resource)
+
+            duplicate, dominated = self._copy(first), self._copy(first, detour=True)
+            self.assertGreater(dominated.get_latency(), first.get_latency())
+            sfc.configurations = [dominated, first, duplicate, other]
+            self.assertEqual((1, 1), prune_configurations(sfc))
+            self.assertEqual([first, other], sfc.configurations)
+
+            # nothing left to drop
+            self.assertEqual((0, 0), prune_configurations(sfc))
+            tested += 1
+        self.assertGreater(tested, 0)
+
+    def test_reject(self):
+        topo = self.model.compiled
+        sfc_list = self.model.sfc_list
+        for sfc in sfc_list[:5]:
+            sfc.latency *= random.random()
+        # a vnf too large for any server
+        vnf = VNF(1, topo.cpu.max() + 1, set(), set())
+        sfc = sfc_list[-1]
+        sfc_list[-1] = SFC([*sfc.vnf_list, vnf], sfc.latency, sfc.throughput, sfc.s, sfc.d, sfc.idx)
+
+        configurations = [generate_configurations(topo, sfc) for sfc in sfc_list]
+        rejected = reject_infeasible_sfcs(self.model)
+        self.assertIn(sfc_list[-1], rejected)
+        self.assertTrue(0 < len(rejected) < len(sfc_list))
+        for sfc, sfc_configurations in zip(sfc_list, configurations):
+            if sfc in rejected:
+                self.assertEqual([], sfc_configurations)
+                self.assertEqual([], sfc.servers)
+                continue
+            # the candidate servers keep every server used
+            for configuration in sfc_configurations:
+                self.assertLessEqual(set(configuration.computing_resource), set(sfc.servers))
+
+
+if __name__ == '__main__':
+    unittest.main()
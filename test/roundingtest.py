@@ -0,0 +1,57 @@
+import random
+import unittest
+
+from para_placement import topology
+from para_placement.cg import generate_configurations
+from para_placement.lp import PlacementLP
+from para_placement.model import *
+from para_placement.solution import _rounding_trial, rounding_best_of, rounding_greedy
+
+
+class RoundingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.k = config.K
+        self.trials = config.ROUNDING_TRIALS
+        config.K = 32
+        config.ROUNDING_TRIALS = 6
+        random.seed(1)
+        topo = topology.fat_tree_topo(4)
+        self.model = Model(topo, generate_sfc_list2(topo, generate_vnf_set(30), 60))
+        for sfc in self.model.sfc_list:
+            sfc.configurations = generate_configurations(self.model.compiled, sfc)
+        PlacementLP(self.model).solve()
+
+    def tearDown(self):
+        config.K = self.k
+        config.ROUNDING_TRIALS = self.trials
+
+    def test_best_of(self):
+        model = self.model
+        configurations_list = [sfc.configurations[:] for sfc in model.sfc_list]
+        values = [[c.varValue for c in configurations] for configurations in configurations_list]
+        for method, seed in [('greedy', 0), ('randomized', 1), ('randomized', 2)]:
+            positions, accepted, latency = _rounding_trial(model, method, seed)
+            self.assertEqual(accepted, sum(position >= 0 for position in positions))
+            # the model is left as it was
+            for sfc, configurations, sfc_values in zip(model.sfc_list, configurations_list, values):
+                self.assertEqual(configurations, sfc.configurations)
+                self.assertEqual(sfc_values, [c.varValue for c in sfc.configurations])
+                self.assertIsNone(sfc.accepted_configuration)
+
+        reports = rounding_best_of(model)
+        self.assertEqual(config.ROUNDING_TRIALS, len(reports))
+        best_of = len(model.get_accepted_sfc_list())
+        self.assertEqual(max(report['accepted'] for report in reports), best_of)
+        ledger = model.ledger()
+        self.assertTrue((ledger.topo.cpu >= 0).all() and (ledger.topo.bandwidth >= 0).all())
+
+        for sfc in model.sfc_list:
+            sfc.accepted_configuration = None
+        rounding_greedy(model)
+        greedy = len(model.get_accepted_sfc_list())
+        self.assertGreater(greedy, 0)
+        self.assertGreaterEqual(best_of, greedy)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import random
+import unittest
+
+import scipy.sparse
+from scipy.sparse.csgraph import dijkstra
+
+from para_placement import topology
+from para_placement.model import *
+from para_placement.routing import Router
+
+
+class RoutingTestCase(unittest.TestCase):
+    def setUp(self):
+        random.seed(1)
+        self.topo = CompiledTopology(topology.generate_randomly(60)).fork()
+        # half of the nodes are relays
+        for node in random.sample(range(self.topo.n), self.topo.n // 2):
+            self.topo.cpu[node] = 0
+
+    def _latency(self, s: int, d: int, tp, at_least: bool, cpu) -> float:
+        """least latency from s to d by scipy on the edges left to Router.route"""
+        topo = self.topo
+        usable = topo.bandwidth >= tp if at_least else topo.bandwidth > tp
+        rows, cols, data = [], [], []
+        for eid, (u, v) in enumerate(topo.edge_ends):
+            if not usable[eid]:
+                continue
+            for start, end in ((u, v), (v, u)):
+                # no server other than d as relay
+                if cpu is not None and cpu[end] > 0 and end != d:
+                    continue
+                rows.append(start)
+                cols.append(end)
+                data.append(topo.latency[eid])
+        graph = scipy.sparse.csr_matrix((data, (rows, cols)), shape=(topo.n, topo.n))
+        return dijkstra(graph, indices=s)[d]
+
+    def test_route(self):
+        topo = self.topo
+        levels = numpy.unique(topo.bandwidth).tolist()
+        routes = 0
+        for router in (Router(0, False), Router(4, False), Router(16, True)):
+            router.sync(topo)
+            for i in range(300):
+                s, d = random.sample(range(topo.n), 2)
+                tp = random.choice(levels)
+                at_least = random.choice([True, False])
+                cpu = random.choice([None, topo.cpu])
+                route, latency, edges = router.route(topo.bandwidth, s, d, tp, at_least, cpu)
+
+                expected = self._latency(s, d, tp, at_least, cpu)
+                if expected == numpy.inf:
+                    self.assertEqual(([], 0, []), (route, latency, edges))
+                    continue
+                routes += 1
+                self.assertAlmostEqual(expected, latency)
+                self.assertEqual((s, d), (route[0], route[-1]))
+                self.assertEqual(topo.route_edges(route), edges)
+                self.assertAlmostEqual(latency, sum(topo.latency[eid] for eid in edges))
+                if cpu is not None:
+                    self.assertTrue(all(cpu[node] <= 0 for node in route[1:-1]))
+        self.assertGreater(routes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import random
+import unittest
+
+import numpy
+import scipy.sparse
+from scipy.sparse.csgraph import dijkstra
+
+from para_placement import topology
+from para_placement.topology import CompiledTopology, ServerIndex
+
+
+class TopologyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.compiled = CompiledTopology(topology.fat_tree_topo(4))
+
+    def test_commit(self):
+        parent = self.compiled.fork()
+        child = parent.fork()
+        server = parent.servers()[0]
+        child.cpu[server] -= 1
+        child.bandwidth[0] -= 1
+        self.assertEqual(parent.cpu[server], self.compiled.cpu[server])
+
+        child.commit()
+        self.assertEqual(parent.cpu[server], self.compiled.cpu[server] - 1)
+        self.assertEqual(parent.bandwidth[0], self.compiled.bandwidth[0] - 1)
+        self.assertEqual(parent.cpu_delta().sum(), 1)
+        # the base stays untouched
+        self.assertIs(child.base, self.compiled)
+        self.assertEqual(self.compiled.cpu[server], child.cpu[server] + 1)
+
+    def test_commit_read_only(self):
+        view = self.compiled.fork()
+        server = view.servers()[0]
+        view.cpu[server] -= 1
+        with self.assertRaises(ValueError):
+            view.commit()
+        self.assertEqual(self.compiled.cpu[server], view.cpu[server] + 1)
+
+    def test_server_index(self):
+        random.seed(1)
+        topo = self.compiled.fork()
+        graph = scipy.sparse.csr_matrix((topo.latency[topo.adj_edges], topo.indices, topo.indptr),
+                                        shape=(topo.n, topo.n))
+        latency = dijkstra(graph)
+        index = ServerIndex(size=3)
+        # chunks of 4 to 8 nodes, split and emptied by the updates
+        index._LOAD = 4
+        index.sync(topo)
+        levels = [0, 1000, 2000, 4000, 8000]
+
+        cpu = topo.cpu.tolist()
+        for i in range(2000):
+            node = random.randrange(topo.n)
+            cpu[node] = random.choice(levels) if random.random() < .5 else random.uniform(0, 8000)
+            if random.random() < .1:
+                topo.cpu[node] = cpu[node]
+                index.sync(topo)
+            else:
+                index.set(node, cpu[node])
+                topo.cpu[node] = cpu[node]
+
+            requirement = random.choice(levels + [random.uniform(0, 8000)])
+            order = sorted((node for node in range(topo.n) if cpu[node] >= requirement),
+                           key=lambda node: (-cpu[node], node))
+            count = random.choice([None, 1, 5, topo.n])
+            self.assertEqual(order[:count], index.top(requirement, count))
+
+            v = random.randrange(topo.n)
+            limit = random.choice([0, random.uniform(0, latency[v].max()), numpy.inf])
+            self.assertEqual([node for node in order if latency[v, node] <= limit], index.within(v, limit, requirement))
+            self.assertEqual(latency[v].tolist(), index.latencies(v))
+        self.assertLessEqual(len(index._latency), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()